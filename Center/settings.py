@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from decouple import config, Csv
 
@@ -7,6 +8,9 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# manage.py test must not share cache or rate-limit files with other runs
+TESTING = sys.argv[1:2] == ["test"]
+
 # ─────────────────────────────────────────────────────────────────────────────
 # BASE
 # ─────────────────────────────────────────────────────────────────────────────
@@ -121,13 +125,48 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 # ─────────────────────────────────────────────────────────────────────────────
 # CACHE
 # ─────────────────────────────────────────────────────────────────────────────
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "steam_profile_cache",
-        "TIMEOUT": 60 * 60 * 12,
+# "sqlite" shares one cache file between all workers and the scheduler;
+# "locmem" keeps a private cache per process (the default under tests)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem" if TESTING else "sqlite")
+
+if CACHE_BACKEND == "sqlite":
+    CACHES = {
+        "default": {
+            "BACKEND": "utils.cache_backends.SQLiteCache",
+            "LOCATION": os.getenv("CACHE_PATH") or BASE_DIR / "cache.sqlite3",
+            "TIMEOUT": 60 * 60 * 12,
+            "OPTIONS": {
+                "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 50000)),
+                "MAX_SIZE": int(os.getenv("CACHE_MAX_SIZE", 256 * 1024 * 1024)),
+            },
+        }
     }
-}
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "steam_profile_cache",
+            "TIMEOUT": 60 * 60 * 12,
+        }
+    }
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MARKET API
+# ─────────────────────────────────────────────────────────────────────────────
+# "sqlite" shares one request budget between all workers and the scheduler
+MARKET_API_RATE_LIMITER = os.getenv("MARKET_API_RATE_LIMITER", "local" if TESTING else "sqlite")
+MARKET_API_RATE_LIMIT_PATH = os.getenv("MARKET_API_RATE_LIMIT_PATH") or BASE_DIR / "market_ratelimit.sqlite3"
+
+# Optional directory for gzip snapshots of the market price feed
+PRICE_FEED_SNAPSHOT_DIR = os.getenv("PRICE_FEED_SNAPSHOT_DIR") or None
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CASE IMPORT
+# ─────────────────────────────────────────────────────────────────────────────
+# On-disk cache of fetched case pages shared by concurrent imports
+IMPORT_CACHE_DIR = os.getenv("IMPORT_CACHE_DIR") or BASE_DIR / "import_cache"
+IMPORT_CACHE_TTL = int(os.getenv("IMPORT_CACHE_TTL", 60 * 60 * 6))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 4))
 
 # ─────────────────────────────────────────────────────────────────────────────
 # SECURITY
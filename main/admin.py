@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.urls import path
 from django.shortcuts import redirect, get_object_or_404
 from django.template.response import TemplateResponse
@@ -7,11 +8,12 @@ from django.utils.translation import gettext_lazy as _
 
 from .models import (
     TransactionLog, Rarity, Item, CaseSection,
-    Case, CaseItem, Profile, Withdrawal
+    Case, CaseItem, Profile, Withdrawal, WithdrawalJob
 )
 from main.models import InventoryItem
-from utils.case_importer import import_case_from_url, CaseImporterError
-from utils.utils import compute_drop_chance
+from utils.case_importer import fetch_page, import_case_from_url, import_cases, CaseImporterError
+from utils.page_cache import IMPORT_CACHE_DIR, IMPORT_CACHE_TTL, PageCache
+from utils.drop_chances import recompute_drop_chances
 
 # -----------------------------------------------------------------------------
 @admin.register(Rarity)
@@ -67,6 +69,33 @@ class CaseAdmin(admin.ModelAdmin):
     )
     inlines = [CaseItemInline]
     change_form_template = 'admin/main/case/change_form.html'
+    actions = ['import_selected_cases', 'recompute_selected_chances']
+
+    @admin.action(description=_("Recalculate drop chances of selected cases"))
+    def recompute_selected_chances(self, request, queryset):
+        """Recompute drop chances of all selected cases in one pass."""
+        report = recompute_drop_chances(queryset.values_list('id', flat=True))
+        messages.success(
+            request,
+            _("Updated %(updated)d of %(checked)d drop chances in %(cases)d cases") % report
+        )
+
+    @admin.action(description=_("Import items of selected cases from their source URL"))
+    def import_selected_cases(self, request, queryset):
+        """Import all selected cases that have a source URL concurrently."""
+        jobs = [(case, case.source_url) for case in queryset if case.source_url]
+        skipped = queryset.count() - len(jobs)
+        if skipped:
+            messages.warning(request, _("%(n)d cases have no source URL") % {'n': skipped})
+        if not jobs:
+            return
+
+        pages = PageCache(IMPORT_CACHE_DIR, fetch_page, ttl=IMPORT_CACHE_TTL)
+        reports = import_cases(jobs, fetch=pages.fetch)
+        for report in reports:
+            messages.success(request, str(report))
+            for err in report.errors:
+                messages.warning(request, f"{report.case}: {err}")
 
     def get_urls(self):
         """Add URLs for recalculating chances and importing items."""
@@ -88,9 +117,7 @@ class CaseAdmin(admin.ModelAdmin):
     def set_chances_view(self, request, object_id):
         """Recompute drop chances for all items in the case."""
         case = get_object_or_404(Case, pk=object_id)
-        for ci in case.case_items.select_related('item'):
-            ci.drop_chance = compute_drop_chance(case.price, ci.item.price)
-            ci.save(update_fields=['drop_chance'])
+        recompute_drop_chances([case.id])
         messages.success(
             request,
             _("Drop chances recalculated successfully")
@@ -104,12 +131,27 @@ class CaseAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             url = request.POST.get('source_url', '').strip()
             try:
-                count, errors = import_case_from_url(case, url)
+                case._meta.get_field('source_url').clean(url, case)
+            except ValidationError as e:
+                messages.error(request, _("Invalid URL: %(error)s") % {'error': ' '.join(e.messages)})
+                return redirect(request.META.get('HTTP_REFERER'))
+            try:
+                report = import_case_from_url(case, url)
+                if report.count:
+                    # only remember a URL that actually yielded items
+                    Case.objects.filter(pk=case.pk).update(source_url=url)
                 messages.success(
                     request,
-                    _("Imported %(count)d items") % {'count': count}
+                    _("Imported %(count)d items (%(created)d new, %(updated)d updated, "
+                      "%(linked)d linked, %(images)d images)") % {
+                        'count': report.count,
+                        'created': report.items_created,
+                        'updated': report.items_updated,
+                        'linked': report.links_created,
+                        'images': report.images_stored,
+                    }
                 )
-                for err in errors:
+                for err in report.errors:
                     messages.warning(request, err)
             except CaseImporterError as e:
                 messages.error(
@@ -178,6 +220,17 @@ class WithdrawalAdmin(admin.ModelAdmin):
     )
 
 
+# -----------------------------------------------------------------------------
+@admin.register(WithdrawalJob)
+class WithdrawalJobAdmin(admin.ModelAdmin):
+    """Admin for WithdrawalJob: display queue state and last error."""
+    list_display = (
+        "id", "withdrawal", "status", "attempts",
+        "run_after", "locked_by", "last_error"
+    )
+    list_filter = ("status",)
+
+
 # -----------------------------------------------------------------------------
 @admin.register(TransactionLog)
 class TransactionLogAdmin(admin.ModelAdmin):
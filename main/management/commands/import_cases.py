@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Case
+from utils.case_importer import IMPORT_WORKERS, fetch_page, import_cases
+from utils.page_cache import IMPORT_CACHE_DIR, IMPORT_CACHE_TTL, PageCache
+
+
+class Command(BaseCommand):
+    """Import items of many cases concurrently through a shared page cache."""
+    help = (
+        "Import case items from wiki.cs.money. MAPPING is a JSON object "
+        "{slug: url} or a text file with one 'slug url' pair per line; "
+        "without it, every case with a source URL is imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("mapping", nargs="?",
+                            help="File mapping case slugs to case page URLs")
+        parser.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                            help="Cases imported at once")
+        parser.add_argument("--cache-dir", default=str(IMPORT_CACHE_DIR),
+                            help="Directory of the on-disk page cache")
+        parser.add_argument("--ttl", type=int, default=IMPORT_CACHE_TTL,
+                            help="Seconds a cached page stays fresh")
+        parser.add_argument("--offline", action="store_true",
+                            help="Only use pages already in the cache (e.g. saved fixtures)")
+        parser.add_argument("--json", action="store_true",
+                            help="Print the import reports as JSON")
+
+    def _read_mapping(self, path: str) -> dict[str, str]:
+        with open(path, encoding="utf-8") as fh:
+            text = fh.read()
+        try:
+            mapping = json.loads(text)
+        except json.JSONDecodeError:
+            mapping = {}
+            for lineno, line in enumerate(text.splitlines(), 1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                parts = line.split(None, 1)
+                if len(parts) != 2:
+                    raise CommandError(f"{path}, line {lineno}: expected 'slug url', got {line!r}")
+                slug, url = parts
+                mapping[slug] = url.strip()
+        if not isinstance(mapping, dict):
+            raise CommandError("Mapping must be a JSON object or 'slug url' lines")
+        return mapping
+
+    def handle(self, *args, **options):
+        if options["mapping"]:
+            mapping = self._read_mapping(options["mapping"])
+            cases = Case.objects.in_bulk(list(mapping), field_name="slug")
+            unknown = sorted(set(mapping) - set(cases))
+            if unknown:
+                raise CommandError(f"Unknown case slugs: {', '.join(unknown)}")
+            jobs = [(cases[slug], url) for slug, url in mapping.items()]
+            for case, url in jobs:
+                if case.source_url != url:
+                    case.source_url = url
+                    case.save(update_fields=["source_url"])
+        else:
+            jobs = [(case, case.source_url) for case in Case.objects.exclude(source_url="")]
+        if not jobs:
+            raise CommandError("No cases to import")
+
+        pages = PageCache(options["cache_dir"], fetch_page,
+                          ttl=options["ttl"], offline=options["offline"])
+        reports = import_cases(jobs, workers=options["workers"], fetch=pages.fetch)
+
+        if options["json"]:
+            self.stdout.write(json.dumps([r.as_dict() for r in reports], indent=2))
+        else:
+            for report in reports:
+                self.stdout.write(str(report))
+                for err in report.errors:
+                    self.stderr.write(f"  {err}")
+            self.stdout.write(f"Page cache: {pages.hits} hits, {pages.misses} downloads")
+        if any(r.errors and not r.count for r in reports):
+            raise CommandError("Some cases failed to import")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Case
+from utils.drop_chances import recompute_drop_chances
+
+
+class Command(BaseCommand):
+    """Recompute CaseItem drop chances from current prices."""
+    help = "Recompute drop chances of all cases, or of the given case slugs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("slugs", nargs="*", help="Limit to these cases")
+
+    def handle(self, *args, **options):
+        case_ids = None
+        if options["slugs"]:
+            cases = Case.objects.in_bulk(options["slugs"], field_name="slug")
+            unknown = sorted(set(options["slugs"]) - set(cases))
+            if unknown:
+                raise CommandError(f"Unknown case slugs: {', '.join(unknown)}")
+            case_ids = [case.id for case in cases.values()]
+
+        report = recompute_drop_chances(case_ids)
+        self.stdout.write(
+            f"Checked {report['checked']} case items, "
+            f"updated {report['updated']} in {report['cases']} cases"
+        )
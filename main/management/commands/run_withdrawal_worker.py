@@ -0,0 +1,38 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from utils.withdrawal_queue import work
+
+
+class Command(BaseCommand):
+    """Run worker threads that process queued withdrawal jobs."""
+    help = "Process queued withdrawal jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4,
+                            help="Concurrent jobs in this process")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when no job is due")
+        parser.add_argument("--idle-sleep", type=float, default=2.0,
+                            help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        results = []
+
+        def run():
+            results.append(work(once=options["once"], idle_sleep=options["idle_sleep"], stop=stop))
+
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(max(1, options["threads"]))]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+        self.stdout.write(f"Processed {sum(results)} withdrawal jobs")
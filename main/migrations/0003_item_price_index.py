@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_remove_inventoryitem_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_item_price_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='withdrawal',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='withdrawal',
+            name='market_status',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='withdrawal',
+            name='stage',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_withdrawal_market_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WithdrawalJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], db_index=True, default='queued', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=64)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('withdrawal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='main.withdrawal')),
+            ],
+        ),
+    ]
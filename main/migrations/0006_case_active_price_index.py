@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_withdrawal_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['active', 'price'], name='case_active_price_idx'),
+        ),
+    ]
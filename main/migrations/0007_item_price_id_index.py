@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_case_active_price_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['price', 'id'], name='item_price_id_idx'),
+        ),
+    ]
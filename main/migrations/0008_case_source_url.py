@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_item_price_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='source_url',
+            field=models.URLField(blank=True, default='', help_text='wiki.cs.money case page used by item imports', max_length=500),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 
 # -----------------------------------------------------------------------------
@@ -75,6 +76,12 @@ class Item(models.Model):
         verbose_name="Rarity"
     )
 
+    class Meta:
+        indexes = [
+            # price lookups and (price, id) keyset pagination of upgrade targets
+            models.Index(fields=["price", "id"], name="item_price_id_idx"),
+        ]
+
     def __str__(self):
         if self.skin_name:
             return f"{self.weapon_name} | {self.skin_name}"
@@ -116,6 +123,17 @@ class Case(models.Model):
         blank=True,
         related_name='main'
     )
+    source_url = models.URLField(
+        max_length=500,
+        blank=True,
+        default="",
+        help_text="wiki.cs.money case page used by item imports"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "price"], name="case_active_price_idx"),
+        ]
 
     @property
     def item_count(self):
@@ -242,10 +260,48 @@ class Withdrawal(models.Model):
     first_try_failed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Last state reported by the market, written by the background poller
+    stage = models.PositiveSmallIntegerField(null=True, blank=True)
+    market_status = models.CharField(max_length=32, blank=True, default="")
+    checked_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self) -> str:
         return f"{self.custom_id} ({self.status})"
 
 
+# -----------------------------------------------------------------------------
+class WithdrawalJob(models.Model):
+    """
+    Queued buy-for submission of a Withdrawal, processed by the worker.
+    """
+    STATUS_CHOICES = (
+        ("queued", "queued"),
+        ("running", "running"),
+        ("done", "done"),
+        ("failed", "failed"),
+    )
+    withdrawal = models.OneToOneField(
+        Withdrawal,
+        on_delete=models.CASCADE,
+        related_name="job"
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default="queued",
+        db_index=True
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Job {self.withdrawal.custom_id} ({self.status})"
+
+
 # -----------------------------------------------------------------------------
 class Contract(models.Model):
     """
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Case, CaseItem, CaseSection, Item, Rarity
+from utils.cache_versions import bump_case_versions
+from utils.case_catalogue import bump_case_catalogue
+from utils.price_catalogue import bump_price_catalogue
+
+# -----------------------------------------------------------------------------
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def case_changed(sender, instance, **kwargs):
+    """Invalidate cached data of a saved or deleted case."""
+    bump_case_versions([instance.id])
+    bump_case_catalogue()
+
+
+# -----------------------------------------------------------------------------
+@receiver(post_save, sender=CaseItem)
+@receiver(post_delete, sender=CaseItem)
+def case_item_changed(sender, instance, **kwargs):
+    """Invalidate the case a CaseItem belongs to."""
+    bump_case_versions([instance.case_id])
+    bump_case_catalogue()
+
+
+# -----------------------------------------------------------------------------
+@receiver(post_save, sender=CaseSection)
+@receiver(post_delete, sender=CaseSection)
+def case_section_changed(sender, instance, **kwargs):
+    """Invalidate the case catalogue, which embeds section names."""
+    bump_case_catalogue()
+
+
+# -----------------------------------------------------------------------------
+@receiver(post_save, sender=Item)
+def item_changed(sender, instance, **kwargs):
+    """Invalidate the price catalogue and every case that contains the item."""
+    bump_price_catalogue()
+    bump_case_versions(
+        CaseItem.objects.filter(item=instance).values_list("case_id", flat=True)
+    )
+
+
+# -----------------------------------------------------------------------------
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    """Drop a deleted item from the price catalogue."""
+    bump_price_catalogue()
+
+
+# -----------------------------------------------------------------------------
+@receiver(post_save, sender=Rarity)
+def rarity_changed(sender, instance, **kwargs):
+    """Invalidate every case that contains an item of the rarity."""
+    bump_case_versions(
+        CaseItem.objects.filter(item__rarity=instance).values_list("case_id", flat=True)
+    )
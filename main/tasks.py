@@ -1,61 +1,277 @@
+import codecs
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
 import requests
-from main.models import Item, Withdrawal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from main.models import CaseItem, InventoryItem, Item, Withdrawal
 from urllib.parse import parse_qs, urlparse
-from utils.csgo_market_api import buy_for_item, get_lowest_price, get_list_buy_info_by_custom_ids
+from utils.cache_versions import bump_case_versions
+from utils.csgo_market_api import (
+    buy_for_item, get_buy_info_by_custom_id, get_lowest_price, get_list_buy_info_by_custom_ids,
+)
+from utils.drop_chances import recompute_drop_chances
+from utils.price_catalogue import bump_price_catalogue
+from utils.withdrawals import STATE_FIELDS, apply_buy_info, market_hash_name
+
+logger = logging.getLogger(__name__)
+
+PRICES_URL = 'https://market.csgo.com/api/v2/prices/USD.json'
+PRICE_UPDATE_BATCH = 500
+PRICE_FEED_STATE_KEY = "price_feed:state"
+FEED_CHUNK = 64 * 1024
+
+# custom_ids per get-list-buy-info-by-custom-id request
+POLL_BATCH_SIZE = getattr(settings, "WITHDRAWAL_POLL_BATCH", 50)
+# (max age in seconds or None, re-check interval in seconds), youngest first
+POLL_TIERS = (
+    (10 * 60, 0),          # first 10 minutes: every run
+    (60 * 60, 3 * 60),     # up to an hour: every 3 minutes
+    (None, 15 * 60),       # older: every 15 minutes
+)
+
+# -----------------------------------------------------------------------------
+def _fetch_price_feed():
+    """
+    Conditionally download the price feed using the stored ETag/Last-Modified.
+    Returns (status, body, state): status is "not_modified", "identical" or
+    "changed"; body is a spooled file with the feed (only when changed);
+    state holds the validators and sha256 to store after a successful sync.
+    """
+    state = cache.get(PRICE_FEED_STATE_KEY) or {}
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    with requests.get(PRICES_URL, headers=headers, timeout=10, stream=True) as response:
+        if response.status_code == 304:
+            return "not_modified", None, state
+        response.raise_for_status()
+
+        body = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        digest = hashlib.sha256()
+        for chunk in response.iter_content(chunk_size=FEED_CHUNK):
+            digest.update(chunk)
+            body.write(chunk)
+        body.seek(0)
+        new_state = {
+            "etag":          response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256":        digest.hexdigest(),
+        }
+
+    if new_state["sha256"] == state.get("sha256"):
+        body.close()
+        cache.set(PRICE_FEED_STATE_KEY, new_state, None)
+        return "identical", None, new_state
+    return "changed", body, new_state
+
+# -----------------------------------------------------------------------------
+def _save_feed_snapshot(body) -> None:
+    """
+    Keep gzip snapshots of the latest and previous feed in
+    settings.PRICE_FEED_SNAPSHOT_DIR (if set) for offline diffing.
+    """
+    directory = getattr(settings, "PRICE_FEED_SNAPSHOT_DIR", None)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    latest = os.path.join(directory, "USD.json.gz")
+    if os.path.exists(latest):
+        os.replace(latest, os.path.join(directory, "USD.prev.json.gz"))
+    body.seek(0)
+    with gzip.open(latest, "wb") as out:
+        shutil.copyfileobj(body, out, FEED_CHUNK)
+    body.seek(0)
+
+# -----------------------------------------------------------------------------
+def _iter_feed_items(chunks):
+    """
+    Incrementally parse the "items" array of the price feed from byte chunks,
+    yielding one item dict at a time without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, in_items = "", 0, False
+
+    for chunk in chunks:
+        buf += utf8.decode(chunk)
+        if not in_items:
+            start = buf.find('"items"')
+            bracket = buf.find("[", start) if start != -1 else -1
+            if bracket == -1:
+                continue
+            buf, pos, in_items = buf[bracket + 1:], 0, True
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # incomplete object, wait for more data
+            yield obj
+        buf, pos = buf[pos:], 0
 
 # -----------------------------------------------------------------------------
 def update_item_prices():
     """
     Fetch price list from the market API and update Item.price and market_hash_name.
+    Only items whose price or hash name changed are written, in batches.
+    Unchanged feeds (HTTP 304 or same content hash) skip parsing and DB work.
+    Returns a report dict with changed/unchanged/missing counts and timing.
     """
-    url = 'https://market.csgo.com/api/v2/prices/USD.json'
+    started = time.monotonic()
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        items_list = data.get('items', [])
-        prices_dict = {item["market_hash_name"]: item for item in items_list}
-    except Exception:
-        return
+        status, body, feed_state = _fetch_price_feed()
+    except Exception as exc:
+        logger.error("update_item_prices: feed error %s", exc)
+        return None
+    if body is None:
+        report = {"skipped": status, "total_seconds": round(time.monotonic() - started, 3)}
+        logger.info("update_item_prices: %s", report)
+        return report
+
+    db_items = list(
+        Item.objects.exclude(market_hash_name__isnull=True)
+        .only("id", "market_hash_name", "price")
+    )
+    wanted = set()
+    for item in db_items:
+        wanted.add(item.market_hash_name)
+        if " | " in item.market_hash_name:
+            wanted.add(item.market_hash_name.split(" | ")[0])
+
+    try:
+        with body:
+            _save_feed_snapshot(body)
+            prices = {
+                row["market_hash_name"]: row.get("price")
+                for row in _iter_feed_items(iter(lambda: body.read(FEED_CHUNK), b""))
+                if row.get("market_hash_name") in wanted
+            }
+    except Exception as exc:
+        logger.error("update_item_prices: feed parse error %s", exc)
+        return None
+    fetched = time.monotonic()
 
-    db_items = Item.objects.exclude(market_hash_name__isnull=True)
-    count = 0
+    changed, unchanged, missing = [], 0, 0
     for item in db_items:
-        orig = item.market_hash_name
-        pricing = prices_dict.get(orig)
-        if not pricing and " | " in orig:
+        name = item.market_hash_name
+        price = prices.get(name)
+        if price is None and " | " in name:
             # fallback to base name if full hash not found
-            fallback = orig.split(" | ")[0]
-            pricing = prices_dict.get(fallback)
-            if pricing:
-                item.market_hash_name = fallback
-        if pricing:
-            new_price = pricing.get("price")
-            if new_price is not None:
-                item.price = new_price
-                item.save(update_fields=['price', 'market_hash_name'])
-                count += 1
-    return count
+            fallback = name.split(" | ")[0]
+            price = prices.get(fallback)
+            if price is not None:
+                name = fallback
+        if price is None:
+            missing += 1
+            continue
+
+        new_price = Decimal(str(price)).quantize(Decimal("0.01"))
+        if new_price == item.price and name == item.market_hash_name:
+            unchanged += 1
+            continue
+        item.price = new_price
+        item.market_hash_name = name
+        changed.append(item)
+
+    with transaction.atomic():
+        Item.objects.bulk_update(
+            changed, ["price", "market_hash_name"], batch_size=PRICE_UPDATE_BATCH
+        )
+    if changed:
+        bump_price_catalogue()
+        ids = [item.id for item in changed]
+        for i in range(0, len(ids), PRICE_UPDATE_BATCH):
+            bump_case_versions(
+                CaseItem.objects.filter(item_id__in=ids[i:i + PRICE_UPDATE_BATCH])
+                .values_list("case_id", flat=True).distinct()
+            )
+
+    cache.set(PRICE_FEED_STATE_KEY, feed_state, None)
+
+    # drop chances follow item prices
+    chances = recompute_drop_chances() if changed else {"updated": 0}
+
+    report = {
+        "changed":       len(changed),
+        "unchanged":     unchanged,
+        "missing":       missing,
+        "chances_updated": chances["updated"],
+        "fetch_seconds": round(fetched - started, 3),
+        "total_seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info("update_item_prices: %s", report)
+    return report
+
+class WithdrawalRetry(Exception):
+    """Raised when a withdrawal attempt failed but may succeed later."""
+    pass
+
+# -----------------------------------------------------------------------------
+def fail_withdrawal(wd: Withdrawal) -> None:
+    """
+    Mark a withdrawal failed and release its inventory item.
+    """
+    wd.status = "failed"
+    Withdrawal.objects.filter(pk=wd.pk).update(status="failed")
+    InventoryItem.objects.filter(pk=wd.inventory_item_id).update(pending=False)
 
 # -----------------------------------------------------------------------------
-def process_withdrawal(withdrawal_id: int):
+def process_withdrawal(withdrawal_id: int) -> bool:
     """
     Attempt to create a new withdrawal offer for a single Withdrawal record.
+    Idempotent per custom_id: an offer the market already knows is not
+    bought again. Returns False on permanent failure and raises
+    WithdrawalRetry when the attempt may be repeated.
     """
-    wd = Withdrawal.objects.select_related("inventory_item", "user__profile").get(id=withdrawal_id)
+    wd = Withdrawal.objects.select_related(
+        "inventory_item__item", "user__profile"
+    ).get(id=withdrawal_id)
+    if wd.status != "pending" or wd.offer_id:
+        return True
     inv_item = wd.inventory_item
     profile  = wd.user.profile
 
     qs = parse_qs(urlparse(profile.trade_url or "").query)
     partner, token = qs.get("partner", [None])[0], qs.get("token", [None])[0]
     if not partner or not token:
-        # mark failed and release the item
-        wd.status = "failed"
-        wd.save(update_fields=["status"])
-        inv_item.pending = False
-        inv_item.save(update_fields=["pending"])
-        return
+        fail_withdrawal(wd)
+        return False
+
+    # a previous attempt may have reached the market before failing locally
+    known, info = get_buy_info_by_custom_id(wd.custom_id)
+    if known and info:
+        wd.offer_id = str(info.get("id") or "")
+        apply_buy_info(wd, info, timezone.now())
+        wd.save(update_fields=["offer_id", *STATE_FIELDS])
+        return True
+    if known or info.get("success") is not False:
+        # no definite "unknown custom_id" answer (network or HTTP error,
+        # empty data): buying now could buy the same item twice
+        raise WithdrawalRetry(info.get("error") or "buy info lookup failed")
 
-    hash_name = inv_item.item.market_hash_name or inv_item.item.weapon_name
+    hash_name = market_hash_name(inv_item)
     ok_price, price_cop = get_lowest_price(hash_name)
     if not ok_price:
         # fallback: price * 1.1
@@ -70,41 +286,87 @@ def process_withdrawal(withdrawal_id: int):
         custom_id=wd.custom_id,
     )
 
-    if ok and data.get("id"):
-        wd.offer_id = data["id"]
-        wd.status   = "pending"
-    else:
-        wd.status = "failed"
-        inv_item.pending = False
-        inv_item.save(update_fields=["pending"])
-    wd.save(update_fields=["offer_id", "status"])
+    offer_id = data.get("id") or (data.get("data") or {}).get("offer_id")
+    if ok and offer_id:
+        wd.offer_id = str(offer_id)
+        wd.save(update_fields=["offer_id"])
+        return True
+    raise WithdrawalRetry(data.get("error") or data.get("message") or "buy-for failed")
+
+# -----------------------------------------------------------------------------
+def _due_withdrawals(now):
+    """
+    Pending, submitted withdrawals whose age tier says they are due a check.
+    """
+    due = Q()
+    younger_than = None
+    for max_age, interval in POLL_TIERS:
+        tier = Q(checked_at__isnull=True) | Q(checked_at__lte=now - timedelta(seconds=interval))
+        if max_age is not None:
+            tier &= Q(created_at__gte=now - timedelta(seconds=max_age))
+        if younger_than is not None:
+            tier &= Q(created_at__lt=now - timedelta(seconds=younger_than))
+        due |= tier
+        younger_than = max_age
+    return (
+        Withdrawal.objects.filter(status="pending").exclude(offer_id="")
+        .filter(due).order_by("created_at")
+    )
 
 # -----------------------------------------------------------------------------
 def poll_withdrawals():
     """
-    Batch-poll pending withdrawals and update statuses or delete items.
+    Poll due pending withdrawals in API-sized chunks, by age tier.
+    Only withdrawals whose market state changed are rewritten; items of
+    completed withdrawals (stage 2) are bulk-deleted together with their
+    withdrawals and those of failed ones (stage 5) released, whether or not
+    the stage just changed.
+    Returns a report dict with checked/changed/completed/failed counts.
     """
-    pending = Withdrawal.objects.filter(status="pending")
-    custom_ids = [wd.custom_id for wd in pending]
-    if not custom_ids:
-        return
+    now = timezone.now()
+    pending = list(_due_withdrawals(now))
+    report = {"checked": 0, "changed": 0, "completed": 0, "failed": 0}
+
+    for i in range(0, len(pending), POLL_BATCH_SIZE):
+        chunk = pending[i:i + POLL_BATCH_SIZE]
+        ok, all_info = get_list_buy_info_by_custom_ids([wd.custom_id for wd in chunk])
+        if not ok:
+            continue
+
+        changed, unchanged_ids, completed, failed = [], [], [], []
+        for wd in chunk:
+            # decide on the current stage, which a view's refresh_stale may
+            # already have stored without finishing the withdrawal
+            is_changed = apply_buy_info(wd, all_info.get(wd.custom_id, {}) or {}, now)
+            if wd.stage == 2:
+                # offer completed: the inventory item leaves the site, and
+                # the CASCADE on Withdrawal.inventory_item removes this
+                # withdrawal and its job with it, so nothing is written
+                completed.append(wd.inventory_item_id)
+                continue
+            if wd.stage == 5:
+                # transfer failed: release the item back
+                wd.status = "failed"
+                failed.append(wd.inventory_item_id)
+                is_changed = True
+            if is_changed:
+                changed.append(wd)
+            else:
+                unchanged_ids.append(wd.id)
+
+        with transaction.atomic():
+            Withdrawal.objects.filter(id__in=unchanged_ids).update(checked_at=now)
+            Withdrawal.objects.bulk_update(changed, ["status", *STATE_FIELDS])
+            if failed:
+                InventoryItem.objects.filter(id__in=failed).update(pending=False)
+            if completed:
+                InventoryItem.objects.filter(id__in=completed).delete()
+
+        report["checked"] += len(chunk)
+        report["changed"] += len(changed)
+        report["completed"] += len(completed)
+        report["failed"] += len(failed)
 
-    ok, all_info = get_list_buy_info_by_custom_ids(custom_ids)
-    removed, returned = [], []
-
-    for wd in pending:
-        info = all_info.get(wd.custom_id, {}) or {}
-        stage = int(info.get("stage", 0))
-        if stage >= 2:
-            # offer completed: delete the inventory item
-            wd.inventory_item.delete()
-            wd.status = "completed"
-            removed.append(wd.inventory_item_id)
-        elif stage == 5:
-            # transfer failed: release the item back
-            inv = wd.inventory_item
-            inv.pending = False
-            inv.save(update_fields=["pending"])
-            wd.status = "failed"
-            returned.append(inv.id)
-        wd.save(update_fields=["status"])
+    if report["checked"]:
+        logger.info("poll_withdrawals: %s", report)
+    return report
@@ -0,0 +1,412 @@
+import heapq
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from main.models import (
+    Case, CaseItem, CaseOpenStat, InventoryItem, Item, Profile, Rarity, TransactionLog,
+    Withdrawal, WithdrawalJob,
+)
+from main.tasks import WithdrawalRetry
+from utils.cache_backends import SQLiteCache
+from utils.drop_table import get_drop_table
+from utils.page_cache import PageCache
+from utils.rate_limit import PRIORITY_HIGH, PRIORITY_LOW, LocalRateLimiter
+from utils.spin_engine import InsufficientFunds, open_case
+from utils.trade_engine import TradeError, run_contract, run_upgrade
+from utils import withdrawal_queue
+
+FIXTURES = Path(__file__).resolve().parent / "tests_fixtures" / "import"
+CASE_URL = "https://wiki.cs.money/cases/fixture-case"
+
+
+# -----------------------------------------------------------------------------
+class EngineTestCase(TestCase):
+    """
+    A case with three items and a user holding a balance of 100.
+    """
+    def setUp(self):
+        # version tokens outlive rolled-back test data in a process cache
+        cache.clear()
+        rarity = Rarity.objects.create(name="Covert", color="#eb4b4b")
+        self.case = Case.objects.create(title="Alpha", slug="alpha", price=Decimal("10.00"))
+        self.items = []
+        for i, price in enumerate(("2.00", "8.00", "30.00")):
+            item = Item.objects.create(weapon_name=f"AK-{i}", skin_name="Test",
+                                       price=Decimal(price), rarity=rarity)
+            CaseItem.objects.create(case=self.case, item=item, drop_chance=1.0)
+            self.items.append(item)
+        self.user = User.objects.create_user("bob", password="pw")
+        self.profile = Profile.objects.create(user=self.user, balance=Decimal("100.00"))
+
+    def give(self, *items, **kwargs) -> list[InventoryItem]:
+        return [InventoryItem.objects.create(profile=self.profile, item=item, **kwargs)
+                for item in items]
+
+
+# -----------------------------------------------------------------------------
+class ImportCasesCommandTests(TestCase):
+    """
+    import_cases against saved wiki.cs.money pages, without network access.
+    """
+    def setUp(self):
+        self.case = Case.objects.create(title="Fixture Case", slug="fixture", price=Decimal("2.50"))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+        pages = PageCache(self.dir / "pages", fetch=None, offline=True)
+        for url, name in (
+            (CASE_URL, "case.html"),
+            (f"{CASE_URL}/knives", "knives.html"),
+            (f"{CASE_URL}/gloves", "gloves.html"),
+        ):
+            pages.store(url, (FIXTURES / name).read_bytes())
+
+    def _mapping(self, text: str) -> str:
+        path = self.dir / "mapping.txt"
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def test_offline_import_from_fixtures(self):
+        out = StringIO()
+        call_command(
+            "import_cases", self._mapping(f"fixture {CASE_URL}  # saved pages\n"),
+            cache_dir=str(self.dir / "pages"), offline=True, workers=1, stdout=out,
+        )
+
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.source_url, CASE_URL)
+        names = set(
+            CaseItem.objects.filter(case=self.case)
+            .values_list("item__weapon_name", "item__skin_name")
+        )
+        self.assertEqual(names, {
+            ("AK-47", "Fixture Red"),
+            ("M4A4", "Fixture Blue"),
+            ("P250", "Fixture Green"),
+            ("Karambit", "Fixture Night"),  # the cheaper of the two knives
+            ("Sport Gloves", "Fixture Vice"),
+        })
+        self.assertEqual(Item.objects.get(weapon_name="M4A4").rarity.name, "Classified")
+        self.assertEqual(Item.objects.get(weapon_name="P250").price, Decimal("0.35"))
+        self.assertTrue(Rarity.objects.filter(name="Extraordinary").exists())
+        self.assertIn("3 hits, 0 downloads", out.getvalue())
+
+        # a second run over the same pages changes nothing
+        call_command(
+            "import_cases", "--json", self._mapping(f"fixture {CASE_URL}\n"),
+            cache_dir=str(self.dir / "pages"), offline=True, workers=1, stdout=StringIO(),
+        )
+        self.assertEqual(CaseItem.objects.filter(case=self.case).count(), 5)
+
+    def test_mapping_line_without_url(self):
+        path = self._mapping(f"fixture {CASE_URL}\n\nbroken\n")
+        with self.assertRaisesMessage(CommandError, "line 3"):
+            call_command("import_cases", path, cache_dir=str(self.dir / "pages"), offline=True)
+
+
+# -----------------------------------------------------------------------------
+class RateLimiterTests(SimpleTestCase):
+    """
+    Lane scheduling of the GCRA limiter, simulated on a fake clock.
+    """
+    def _send_times(self, limiter, callers):
+        """
+        Run concurrent callers [(arrival, priority), ...] and return the
+        sorted (send_time, priority) of every request.
+        """
+        now = [0.0]
+        limiter.clock = lambda: now[0]
+        events = [(at, i, prio) for i, (at, prio) in enumerate(callers)]
+        heapq.heapify(events)
+        sent = []
+        while events:
+            at, i, prio = heapq.heappop(events)
+            now[0] = at
+            delay, booked = limiter.try_reserve(prio)
+            if booked:
+                sent.append((at + delay, prio))
+            else:
+                heapq.heappush(events, (at + delay, i, prio))
+        return sorted(sent)
+
+    def test_budget_holds_with_both_lanes_busy(self):
+        limiter = LocalRateLimiter(rate=5, per=1)
+        sent = self._send_times(
+            limiter, [(0.0, PRIORITY_LOW)] * 20 + [(0.0, PRIORITY_HIGH)] * 20
+        )
+        times = [t for t, _ in sent]
+        self.assertEqual(len(times), 40)
+        # a full burst of 5 plus 5 per second
+        for window, allowed in ((1, 10), (2, 15), (4, 25)):
+            busiest = max(sum(1 for t in times if start <= t < start + window) for start in times)
+            self.assertLessEqual(busiest, allowed, f"{busiest} requests in {window}s")
+
+    def test_high_lane_is_not_queued_behind_low(self):
+        limiter = LocalRateLimiter(rate=5, per=1)
+        sent = self._send_times(
+            limiter, [(0.0, PRIORITY_LOW)] * 20 + [(0.1, PRIORITY_HIGH)] * 5
+        )
+        last_high = max(t for t, prio in sent if prio == PRIORITY_HIGH)
+        # the five purchases go out within the first second although 20
+        # polls were waiting; a shared queue would have put them after 3s
+        self.assertLess(last_high, 1.0)
+
+
+# -----------------------------------------------------------------------------
+class SpinEngineTests(EngineTestCase):
+    """
+    open_case debits, records drops and refuses uncovered spins.
+    """
+    def test_open_debits_and_records_every_drop(self):
+        result = open_case(self.user, self.profile, self.case, get_drop_table(self.case.id), count=3)
+
+        self.assertEqual(result["new_balance"], Decimal("70.00"))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.balance, Decimal("70.00"))
+        self.assertEqual(self.profile.cases_opened, 3)
+        self.assertEqual(self.profile.favorite_case_id, self.case.id)
+        best = max((entry for entry, _ in result["drops"]), key=lambda e: e["price"])
+        self.assertEqual(self.profile.best_drop_item_id, best["id"])
+        self.assertEqual(
+            sorted(InventoryItem.objects.filter(profile=self.profile).values_list("id", flat=True)),
+            sorted(inv_id for _, inv_id in result["drops"]),
+        )
+        self.assertEqual(TransactionLog.objects.filter(user=self.user, action_type="open_case").count(), 3)
+        self.assertEqual(CaseOpenStat.objects.get(user=self.user, case=self.case).opens, 3)
+
+    def test_insufficient_funds_leaves_everything_untouched(self):
+        with self.assertRaises(InsufficientFunds):
+            open_case(self.user, self.profile, self.case, get_drop_table(self.case.id), count=11)
+
+        # a stale in-memory balance is caught by the conditional debit
+        Profile.objects.filter(pk=self.profile.pk).update(balance=Decimal("5.00"))
+        with self.assertRaises(InsufficientFunds):
+            open_case(self.user, self.profile, self.case, get_drop_table(self.case.id))
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.balance, Decimal("5.00"))
+        self.assertEqual(self.profile.cases_opened, 0)
+        self.assertFalse(InventoryItem.objects.exists())
+        self.assertFalse(TransactionLog.objects.exists())
+        self.assertFalse(CaseOpenStat.objects.exists())
+
+
+# -----------------------------------------------------------------------------
+class TradeEngineTests(EngineTestCase):
+    """
+    Upgrades and contracts consume the stake atomically.
+    """
+    def test_upgrade_win_replaces_stake_with_target(self):
+        stake = self.give(self.items[0], self.items[1])  # 10.00
+        with mock.patch("utils.trade_engine.random.uniform", return_value=0):
+            result = run_upgrade(self.user, self.profile, [i.id for i in stake],
+                                 self.items[2], Decimal("5.00"))
+
+        self.assertTrue(result["is_win"])
+        self.assertEqual(result["chance"], Decimal("50"))
+        self.assertEqual(result["new_balance"], Decimal("95.00"))
+        self.assertEqual(
+            list(InventoryItem.objects.values_list("item_id", flat=True)), [self.items[2].id]
+        )
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.upgrades_count, 1)
+        self.assertEqual(TransactionLog.objects.filter(action_type="upgrade").count(), 1)
+
+    def test_upgrade_loss_pays_cashback(self):
+        stake = self.give(self.items[1])  # 8.00
+        with mock.patch("utils.trade_engine.random.uniform", return_value=100):
+            result = run_upgrade(self.user, self.profile, [i.id for i in stake],
+                                 self.items[2], Decimal("2.00"))
+
+        self.assertFalse(result["is_win"])
+        self.assertIsNone(result["new_item"])
+        # 100 - 2 extra + 2% of the 10.00 attempt
+        self.assertEqual(result["new_balance"], Decimal("98.20"))
+        self.assertFalse(InventoryItem.objects.exists())
+
+    def test_pending_or_foreign_items_are_not_staked(self):
+        pending = self.give(self.items[0], pending=True)
+        free = self.give(self.items[1])
+        with self.assertRaises(TradeError):
+            run_upgrade(self.user, self.profile, [pending[0].id, free[0].id],
+                        self.items[2], Decimal("0"))
+        with self.assertRaises(TradeError):
+            run_contract(self.user, self.profile, [free[0].id, pending[0].id, 999999], Decimal("0"))
+
+        self.assertEqual(InventoryItem.objects.count(), 2)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.balance, Decimal("100.00"))
+
+    def test_contract_debits_extra_and_awards_one_item(self):
+        stake = self.give(*self.items[:2], self.items[0])  # 12.00
+        with mock.patch("utils.trade_engine.random.uniform", return_value=70):  # x2
+            result = run_contract(self.user, self.profile, [i.id for i in stake], Decimal("3.00"))
+
+        self.assertEqual(result["multiplier"], 2)
+        self.assertEqual(result["result_value"], Decimal("30.00"))
+        self.assertEqual(result["new_balance"], Decimal("97.00"))
+        self.assertEqual(list(InventoryItem.objects.all()), [result["new_item"]])
+        self.assertTrue(Decimal("7.50") <= result["new_item"].item.price <= Decimal("30.00"))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.contracts_count, 1)
+
+    def test_contract_extra_above_balance_is_refused(self):
+        stake = self.give(*self.items)
+        with self.assertRaises(InsufficientFunds):
+            run_contract(self.user, self.profile, [i.id for i in stake], Decimal("100.01"))
+        self.assertEqual(InventoryItem.objects.count(), 3)
+
+
+# -----------------------------------------------------------------------------
+class WithdrawalQueueTests(EngineTestCase):
+    """
+    Enqueueing, claiming and retrying withdrawal jobs.
+    """
+    def test_enqueue_reports_repeated_and_unknown_ids(self):
+        inv, = self.give(self.items[0])
+        queued, errors = withdrawal_queue.enqueue_withdrawals(
+            self.user, self.profile, [str(inv.id), str(inv.id), "abc", "999999"]
+        )
+
+        self.assertEqual(queued, [inv.id])
+        self.assertCountEqual(errors, [
+            f"{inv.id}: already pending", "abc: not found", "999999: not found",
+        ])
+        inv.refresh_from_db()
+        self.assertTrue(inv.pending)
+        self.assertEqual(Withdrawal.objects.count(), 1)
+        self.assertEqual(WithdrawalJob.objects.get().status, "queued")
+
+        # the item is now pending and cannot be queued twice
+        queued, errors = withdrawal_queue.enqueue_withdrawals(self.user, self.profile, [str(inv.id)])
+        self.assertEqual((queued, errors), ([], [f"{inv.id}: already pending"]))
+
+    def test_retries_back_off_then_fail_and_release_the_item(self):
+        inv, = self.give(self.items[0])
+        withdrawal_queue.enqueue_withdrawals(self.user, self.profile, [str(inv.id)])
+        job_id = WithdrawalJob.objects.get().id
+
+        with mock.patch.object(withdrawal_queue, "process_withdrawal",
+                               side_effect=WithdrawalRetry("market busy")):
+            for attempt in range(1, withdrawal_queue.MAX_ATTEMPTS):
+                started = timezone.now()
+                job = withdrawal_queue.claim_job("test")
+                self.assertEqual((job.id, job.attempts), (job_id, attempt))
+                withdrawal_queue.run_job(job)
+
+                job.refresh_from_db()
+                self.assertEqual(job.status, "queued")
+                self.assertEqual(job.last_error, "market busy")
+                backoff = withdrawal_queue.BACKOFF_BASE * 2 ** (attempt - 1)
+                self.assertGreaterEqual(job.run_after, started + timedelta(seconds=backoff))
+                # not due yet
+                self.assertIsNone(withdrawal_queue.claim_job("test"))
+                WithdrawalJob.objects.filter(pk=job_id).update(run_after=timezone.now())
+
+            withdrawal_queue.run_job(withdrawal_queue.claim_job("test"))
+
+        job = WithdrawalJob.objects.select_related("withdrawal").get(pk=job_id)
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.withdrawal.status, "failed")
+        inv.refresh_from_db()
+        self.assertFalse(inv.pending)
+
+    def test_stale_running_job_is_reclaimed(self):
+        inv, = self.give(self.items[0])
+        withdrawal_queue.enqueue_withdrawals(self.user, self.profile, [str(inv.id)])
+        job = withdrawal_queue.claim_job("crashed-worker")
+        self.assertIsNone(withdrawal_queue.claim_job("other"))
+
+        WithdrawalJob.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=withdrawal_queue.LOCK_TIMEOUT + 1)
+        )
+        reclaimed = withdrawal_queue.claim_job("other")
+        self.assertEqual((reclaimed.id, reclaimed.locked_by, reclaimed.attempts), (job.id, "other", 2))
+
+    def test_job_of_deleted_withdrawal_is_skipped(self):
+        inv, = self.give(self.items[0])
+        withdrawal_queue.enqueue_withdrawals(self.user, self.profile, [str(inv.id)])
+        job = withdrawal_queue.claim_job("test")
+        inv.delete()  # cascades to the withdrawal and its job
+
+        withdrawal_queue.run_job(job)
+        self.assertFalse(WithdrawalJob.objects.exists())
+
+
+# -----------------------------------------------------------------------------
+class SQLiteCacheTests(SimpleTestCase):
+    """
+    Entry and size limits of the SQLite cache backend.
+    """
+    def make_cache(self, **options) -> SQLiteCache:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return SQLiteCache(Path(tmp.name) / "cache.sqlite3", {"OPTIONS": options})
+
+    def count(self, c: SQLiteCache) -> int:
+        return c._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def test_entry_cap_evicts_least_recently_used(self):
+        c = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=0, CULL_EVERY=1)
+        clock = mock.patch("utils.cache_backends.time").start()
+        self.addCleanup(mock.patch.stopall)
+        for i in range(10):
+            clock.time.return_value = float(i)
+            c.set(f"k{i}", i)
+        clock.time.return_value = 100.0
+        self.assertEqual(c.get("k0"), 0)  # refreshes its LRU stamp
+
+        for i in range(10, 15):
+            clock.time.return_value = 100.0 + i
+            c.set(f"k{i}", i)
+
+        self.assertEqual(self.count(c), 10)
+        self.assertEqual(c.get("k0"), 0)
+        self.assertEqual(c.get_many([f"k{i}" for i in range(1, 6)]), {})
+        self.assertEqual(c.get("k14"), 14)
+
+    def test_expired_entries_go_first(self):
+        c = self.make_cache(MAX_ENTRIES=5, CULL_FREQUENCY=0, CULL_EVERY=1)
+        clock = mock.patch("utils.cache_backends.time").start()
+        self.addCleanup(mock.patch.stopall)
+        clock.time.return_value = 0.0
+        c.set("short", 1, timeout=10)
+        for i in range(4):
+            c.set(f"k{i}", i)
+        clock.time.return_value = 20.0
+        c.set("new", 1)
+
+        self.assertEqual(self.count(c), 5)
+        self.assertEqual(c.get_many(["k0", "k1", "k2", "k3", "new"]),
+                         {"k0": 0, "k1": 1, "k2": 2, "k3": 3, "new": 1})
+
+    def test_size_cap(self):
+        c = self.make_cache(MAX_ENTRIES=1000, MAX_SIZE=10_000, CULL_EVERY=1)
+        for i in range(20):
+            c.set(f"blob{i}", b"x" * 1000)
+        size = c._conn().execute("SELECT SUM(size) FROM cache").fetchone()[0]
+        self.assertLessEqual(size, 10_000)
+        self.assertIsNotNone(c.get("blob19"))
+
+    def test_totals_are_checked_on_a_sample_of_writes(self):
+        c = self.make_cache(MAX_ENTRIES=5, CULL_FREQUENCY=0, CULL_EVERY=100)
+        with mock.patch("utils.cache_backends.random.random", return_value=0.5):
+            for i in range(20):
+                c.set(f"k{i}", i)
+        self.assertEqual(self.count(c), 20)  # no write was sampled
+
+        with mock.patch("utils.cache_backends.random.random", return_value=0.0):
+            c.set("k20", 20)
+        self.assertEqual(self.count(c), 5)
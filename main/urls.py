@@ -21,5 +21,6 @@ urlpatterns = [
     path('contracts/create/', views.create_contract_view, name='create_contract'),
     path("poll-withdrawals/", views.poll_withdrawals_view, name="poll-withdrawals-url"),
     path('api/targets/', views.load_targets, name='load_targets'),
+    path('api/targets/recommend/', views.recommend_targets_view, name='recommend_targets'),
     path("deposit/", views.deposit_view, name="add_balance"),
 ]
@@ -1,55 +1,133 @@
 from __future__ import annotations
 
 import logging
-import random
 import json
-import time
 from decimal import Decimal
 
 from django.contrib.auth import logout
 from django.shortcuts import get_object_or_404, redirect, render
 from django.db import transaction
+from django.db.models import Q, Sum
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from urllib.parse import urlparse, parse_qs
 
-from .models import (
-    Case, Item, InventoryItem, Withdrawal,
-    CaseOpenStat, TransactionLog
-)
-from utils.csgo_market_api import (
-    get_buy_info_by_custom_id,
-    buy_for_item,
-    get_lowest_price
-)
+from .models import Case, Item, InventoryItem, Withdrawal
+from utils.case_catalogue import case_entry, filter_cases, get_case_catalogue
+from utils.case_pages import get_case_page
+from utils.drop_table import get_drop_table
+from utils.spin_engine import InsufficientFunds, open_case
+from utils.trade_engine import TradeError, run_contract, run_upgrade
+from utils.upgrade_targets import recommend_targets
 from utils.utils import steamid32_to_64
+from utils.withdrawal_queue import enqueue_withdrawals
+from utils.withdrawals import refresh_stale
 
 logger = logging.getLogger(__name__)
 
+MAX_SPIN_COUNT = 50  # upper bound for ?count= on spin_case
+SEARCH_PAGE_SIZE = 24
+TARGETS_PAGE_SIZE = 60  # upgrade targets per page (first page is inline)
+SEARCH_MAX_LIMIT = 100
+
 # -----------------------------------------------------------------------------
+def _target_page(
+    limit: int,
+    cursor: tuple[Decimal, int] | None = None,
+    min_price: Decimal | None = None,
+    max_price: Decimal | None = None,
+    name: str = "",
+) -> tuple[list[dict], str | None]:
+    """
+    Return one page of upgrade targets ordered by (price, id) descending,
+    starting after cursor, and the cursor of the next page (or None).
+    """
+    qs = Item.objects.select_related("rarity")
+    if cursor is not None:
+        price, item_id = cursor
+        qs = qs.filter(Q(price__lt=price) | Q(price=price, id__lt=item_id))
+    if min_price is not None:
+        qs = qs.filter(price__gte=min_price)
+    if max_price is not None:
+        qs = qs.filter(price__lte=max_price)
+    if name:
+        qs = qs.filter(Q(weapon_name__icontains=name) | Q(skin_name__icontains=name))
+
+    items = list(qs.order_by("-price", "-id")[:limit])
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = f"{last.price}:{last.id}"
+    return [_item_json(it) for it in items], next_cursor
+
+
 @require_GET
 def load_targets(request):
     """
-    Return a list of items for the upgrade panel with pagination.
-    Query params: offset=N, limit=M.
+    Return a page of items for the upgrade panel, most expensive first.
+    Query params: cursor=PRICE:ID, limit=M, min_price, max_price, name.
     """
     try:
-        limit  = max(1, min(int(request.GET.get("limit", 60)), 200))
-        offset = max(0,     int(request.GET.get("offset", 0)))
-    except ValueError:
-        return JsonResponse({"success": False, "message": "bad offset/limit"}, status=400)
-
-    qs = Item.objects.order_by("-price")[offset: offset + limit]
-    data = [_item_json(it) for it in qs]
-
+        limit = max(1, min(int(request.GET.get("limit", TARGETS_PAGE_SIZE)), 200))
+        cursor = None
+        if request.GET.get("cursor"):
+            price, item_id = request.GET["cursor"].split(":")
+            cursor = (Decimal(price), int(item_id))
+        min_price = Decimal(request.GET["min_price"]) if request.GET.get("min_price") else None
+        max_price = Decimal(request.GET["max_price"]) if request.GET.get("max_price") else None
+    except (ValueError, ArithmeticError):
+        return JsonResponse({"success": False, "message": "bad cursor/limit/price"}, status=400)
+
+    data, next_cursor = _target_page(
+        limit, cursor, min_price, max_price, request.GET.get("name", "").strip()
+    )
     return JsonResponse(
-        {"success": True, "items": data},
+        {"success": True, "items": data, "next_cursor": next_cursor},
         json_dumps_params={"ensure_ascii": False}
     )
 
 
+@require_GET
+@login_required
+def recommend_targets_view(request):
+    """
+    Return upgrade targets for a stake, bucketed by win chance.
+    Query params: items=ID,ID,... (own inventory items), extra=AMOUNT.
+    """
+    try:
+        inv_ids = [int(x) for x in request.GET.get("items", "").split(",") if x]
+        extra = Decimal(request.GET.get("extra") or 0)
+        if not extra.is_finite():
+            raise ValueError(extra)
+        extra = max(extra, Decimal("0"))
+    except (ValueError, ArithmeticError):
+        return JsonResponse({"success": False, "message": "bad items/extra"}, status=400)
+
+    stake = extra
+    if inv_ids:
+        stake += InventoryItem.objects.filter(
+            profile=request.user.profile, id__in=inv_ids
+        ).aggregate(total=Sum("item__price"))["total"] or 0
+
+    buckets = recommend_targets(stake)
+    items = Item.objects.select_related("rarity").in_bulk(
+        [i for b in buckets for i in b["ids"]]
+    )
+    return JsonResponse({
+        "success": True,
+        "stake": float(stake),
+        "buckets": [{
+            "chance":    b["chance"],
+            "min_price": float(b["min_price"]),
+            "max_price": float(b["max_price"]),
+            "total":     b["total"],
+            "items":     [_item_json(items[i]) for i in b["ids"] if i in items],
+        } for b in buckets],
+    }, json_dumps_params={"ensure_ascii": False})
+
+
 # -----------------------------------------------------------------------------
 # Helper to serialize Item or InventoryItem to JSON
 # -----------------------------------------------------------------------------
@@ -81,29 +159,43 @@ def cases_list(request):
     """
     Display active cases grouped by section.
     """
-    sections = (
-        Case.objects.select_related("section")
-        .filter(active=True)
-        .order_by("section__id")
-    )
+    sections = get_case_catalogue().cases
     return render(request, "main/cases_list.html", {"sections": sections})
 
 
+def _page_params(request) -> tuple[int, int]:
+    """
+    Read offset/limit pagination params for the case search endpoints.
+    """
+    try:
+        limit  = max(1, min(int(request.GET.get("limit", SEARCH_PAGE_SIZE)), SEARCH_MAX_LIMIT))
+        offset = max(0,     int(request.GET.get("offset", 0)))
+    except ValueError:
+        limit, offset = SEARCH_PAGE_SIZE, 0
+    return offset, limit
+
+
 @require_GET
 def cases_search(request):
     """
-    Search active cases by title term and return JSON.
+    Search active cases by title term and return one page of JSON.
+    Query params: term, offset=N, limit=M.
     """
     term = request.GET.get("term", "").lower().strip()
-    qs = Case.objects.filter(active=True)
-    data = [_case_json(c) for c in qs if term in c.title.lower()]
-    return JsonResponse({"main": data, "empty": not data})
+    offset, limit = _page_params(request)
+    data, total = get_case_catalogue().search(term, offset, limit)
+    return JsonResponse({
+        "main": data, "empty": not data,
+        "total": total, "has_more": offset + len(data) < total,
+    })
 
 
 @require_GET
 def cases_filter_search(request):
     """
-    Filter active cases by title term and price range and return JSON.
+    Filter active cases by title term and price range in the database
+    and return one page of JSON.
+    Query params: term, min_price, max_price, ordering, offset=N, limit=M.
     """
     term = request.GET.get("term", "").lower().strip()
     try:
@@ -111,131 +203,86 @@ def cases_filter_search(request):
         max_price = Decimal(request.GET.get("max_price")) if request.GET.get("max_price") else None
     except Exception:
         min_price = max_price = None
+    offset, limit = _page_params(request)
 
-    qs = Case.objects.filter(active=True)
-    data: list[dict] = []
-    for c in qs:
-        if term and term not in c.title.lower():
-            continue
-        if min_price and c.price < min_price:
-            continue
-        if max_price and c.price > max_price:
-            continue
-        data.append(_case_json(c))
-    return JsonResponse({"main": data, "empty": not data})
+    qs = filter_cases(term, min_price, max_price, request.GET.get("ordering", "id"))
+    # fetch one extra row to know whether another page exists
+    page = list(qs[offset: offset + limit + 1])
+    data = [case_entry(c)["json"] for c in page[:limit]]
+    return JsonResponse({"main": data, "empty": not data, "has_more": len(page) > limit})
 
 
 # -----------------------------------------------------------------------------
 # JSON / CASE DETAIL / SPIN
 # -----------------------------------------------------------------------------
-def _case_json(case: Case) -> dict:
-    """
-    Convert a Case instance to a JSON-serializable dict.
-    """
-    return {
-        "id": case.id,
-        "title": case.title,
-        "price": f"{case.price:.2f}",
-        "old_price": f"{case.old_price:.2f}" if case.old_price else None,
-        "slug": case.slug,
-        "item_count": case.item_count,
-        "box_image": case.box_image.url if case.box_image else "",
-    }
-
-
 def case_detail(request, slug):
     """
     Display case details and compute how much more the user needs.
     """
-    case = get_object_or_404(Case, slug=slug, active=True)
-    items_qs = case.case_items.select_related('item__rarity')
-    case_items = []
-    for ci in items_qs:
-        item = ci.item
-        rarity = item.rarity
-        case_items.append({
-            'id': ci.item.id,
-            'weapon_name': item.weapon_name,
-            'skin_name': item.skin_name or '',
-            'image_url': item.image.url,
-            'rarity': rarity.name if rarity else None,
-            'rarity_color': rarity.color if rarity else '#ffffff',
-            'rarity_color_full': (rarity.color + "80") if rarity else "#ffffff80",
-            'rarity_color_light': (rarity.color + "33") if rarity else "#ffffff33",
-            'drop_chance': ci.drop_chance,
-            'price': float(item.price),
-        })
+    entry = get_case_catalogue().get(slug)
+    page = get_case_page(entry["id"]) if entry else None
+    if page is None:
+        raise Http404("Case not found")
+
     need_amount = None
     if request.user.is_authenticated:
         bal = request.user.profile.balance
-        if bal < case.price:
-            need_amount = case.price - bal
+        if bal < page["case"]["price"]:
+            need_amount = page["case"]["price"] - bal
 
     return render(request, 'case/case_detail.html', {
-        'case':            case,
-        'case_items_json': json.dumps(case_items),
-        'need_amount':     need_amount,
+        **page,
+        'need_amount': need_amount,
     })
 
 
+def _drop_json(entry: dict, inv_id: int) -> dict:
+    """
+    Convert a drop-table entry won by a spin to a JSON-serializable dict.
+    """
+    return {
+        'winning_item_id':   entry['id'],
+        'inventory_item_id': inv_id,
+        'item': {
+            'weapon_name':  entry['weapon_name'],
+            'skin_name':    entry['skin_name'],
+            'price':        float(entry['price']),
+            'image_url':    entry['image_url'],
+            'rarity_color': entry['rarity_color'],
+        },
+    }
+
+
 @require_POST
 @login_required
 def spin_case(request, slug):
     """
-    Process a case spin, award an item, and update user records.
+    Process one or several case spins (?count=N), award items, and update user records.
     """
     case = get_object_or_404(Case, slug=slug, active=True)
     profile = request.user.profile
 
-    if profile.balance < case.price:
-        return JsonResponse({'error': 'Insufficient funds'}, status=400)
-    profile.balance -= case.price
-    profile.save(update_fields=['balance'])
-
-    ci_list = list(case.case_items.filter(never_drop=False).select_related('item'))
-    items = [ci.item for ci in ci_list]
-    weights = [ci.drop_chance for ci in ci_list]
-
-    won_item = random.choices(items, weights=weights, k=1)[0]
-    inv_item = InventoryItem.objects.create(profile=profile, item=won_item)
-
-    TransactionLog.objects.create(
-        user=request.user,
-        action_type='open_case',
-        details=(
-            f"Opened case «{case.title}» (id={case.id}), "
-            f"won «{won_item}» (id={won_item.id}), "
-            f"charged {case.price:.2f}"
-        )
-    )
-
-    stat, _ = CaseOpenStat.objects.get_or_create(user=request.user, case=case)
-    stat.opens += 1
-    stat.save(update_fields=['opens'])
+    try:
+        count = int(request.GET.get('count') or request.POST.get('count') or 1)
+    except ValueError:
+        return JsonResponse({'error': 'Bad count'}, status=400)
+    if not 1 <= count <= MAX_SPIN_COUNT:
+        return JsonResponse({'error': f'Count must be between 1 and {MAX_SPIN_COUNT}'}, status=400)
 
-    if not profile.favorite_case or stat.opens > CaseOpenStat.objects.get(
-        user=request.user, case=profile.favorite_case
-    ).opens:
-        profile.favorite_case = case
-    if not profile.best_drop_item or won_item.price > profile.best_drop_item.price:
-        profile.best_drop_item = won_item
+    table = get_drop_table(case.id)
+    if not len(table):
+        return JsonResponse({'error': 'Case has no items'}, status=400)
 
-    profile.cases_opened += 1
-    profile.save(update_fields=[
-        'favorite_case', 'best_drop_item', 'cases_opened', 'balance'
-    ])
+    try:
+        result = open_case(request.user, profile, case, table, count)
+    except InsufficientFunds:
+        return JsonResponse({'error': 'Insufficient funds'}, status=400)
 
+    drops = [_drop_json(entry, inv_id) for entry, inv_id in result['drops']]
     return JsonResponse({
-        'winning_item_id':    won_item.id,
-        'inventory_item_id':  inv_item.id,
-        'item': {
-            'weapon_name': won_item.weapon_name,
-            'skin_name':   won_item.skin_name or '',
-            'price':       float(won_item.price),
-            'image_url':   won_item.image.url,
-            'rarity_color': won_item.rarity.color if won_item.rarity else '#ffffff',
-        },
-        'new_balance': float(profile.balance),
+        **drops[0],
+        'items':       drops,
+        'new_balance': float(result['new_balance']),
     })
 
 
@@ -250,13 +297,11 @@ def profile_view(request):
     profile = request.user.profile
     now = timezone.now()
 
-    pending = Withdrawal.objects.filter(user=request.user, status="pending")
-    status_dict: dict[int, str] = {}
-    for wd in pending:
-        ok, info = get_buy_info_by_custom_id(wd.custom_id)
-        stage = info.get('stage')
-        if ok and stage:
-            status_dict[wd.inventory_item.id] = str(stage)
+    pending = list(Withdrawal.objects.filter(user=request.user, status="pending"))
+    refresh_stale(pending)
+    status_dict: dict[int, str] = {
+        wd.inventory_item_id: str(wd.stage) for wd in pending if wd.stage
+    }
 
     withdrawn_ids = list(
         Withdrawal.objects
@@ -281,7 +326,7 @@ def profile_view(request):
         'contracts_count': profile.contracts_count,
         'favorite_case': profile.favorite_case,
         'best_drop_item': profile.best_drop_item,
-        'active_withdrawals_json': json.dumps(list(pending.values_list("inventory_item_id", flat=True))),
+        'active_withdrawals_json': json.dumps([wd.inventory_item_id for wd in pending]),
     })
 
 
@@ -291,20 +336,24 @@ def profile_view(request):
 @login_required
 def poll_withdrawals_view(request):
     """
-    Check pending withdrawals, update statuses, and return removed/returned item IDs.
+    Check pending withdrawals against their locally stored market state,
+    update statuses, and return removed/returned item IDs.
     """
     now = timezone.now()
-    pending_qs = (
+    pending_qs = list(
         Withdrawal.objects
         .filter(user=request.user, status="pending")
         .select_related("inventory_item")
     )
+    refresh_stale(pending_qs)
 
     removed, returned = [], []
     for wd in pending_qs:
-        ok, info = get_buy_info_by_custom_id(wd.custom_id)
-        stage = int(info.get("stage", 0)) if ok else None
-        status_failed = (info.get("status") == "failed")
+        if not wd.offer_id:
+            # still queued for submission by the withdrawal worker
+            continue
+        stage = wd.stage
+        status_failed = (wd.market_status == "failed")
         age = (now - wd.created_at).total_seconds()
 
         if stage == 2:
@@ -395,6 +444,9 @@ def sell_items(request):
             .filter(profile=request.user.profile, id__in=item_ids)
         if not qs.exists():
             return JsonResponse({"success": False, "error": "No matching items"}, status=404)
+        if qs.filter(pending=True).exists():
+            # items being withdrawn cannot be sold back
+            return JsonResponse({"success": False, "error": "Some items are pending withdrawal"}, status=409)
 
         total_price = sum(i.item.price for i in qs)
         profile = request.user.profile
@@ -417,7 +469,7 @@ def sell_items(request):
 @login_required
 def buy_for_item_view(request):
     """
-    Create withdrawal offers for selected items.
+    Queue withdrawal offers for selected items; the worker submits them.
     """
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -426,7 +478,6 @@ def buy_for_item_view(request):
     if not item_ids:
         return JsonResponse({"error": "No item_ids"}, status=400)
 
-    ok_ids, err_msgs = [], []
     profile = request.user.profile
 
     if profile.withdraw_blocked:
@@ -437,57 +488,7 @@ def buy_for_item_view(request):
     if not partner or not token:
         return JsonResponse({"error": "No trade link set"}, status=400)
 
-    for item_id in item_ids:
-        try:
-            inv_item = InventoryItem.objects.get(id=item_id, profile=profile)
-        except InventoryItem.DoesNotExist:
-            err_msgs.append(f"{item_id}: not found")
-            continue
-
-        if inv_item.pending or Withdrawal.objects.filter(
-            user=request.user, inventory_item=inv_item, status="pending"
-        ).exists():
-            err_msgs.append(f"{item_id}: already pending")
-            continue
-
-        hash_name = inv_item.item.market_hash_name or (
-            f"{inv_item.item.weapon_name} | {inv_item.item.skin_name}"
-            if inv_item.item.skin_name else inv_item.item.weapon_name
-        )
-
-        base_usd = float(inv_item.item.price)
-        price_cop = int(round(base_usd * 100 * 1.05))
-        logger.debug("Using local price: base_usd=%s → price_cop=%s", base_usd, price_cop)
-
-        custom_id = f"{request.user.id}_{item_id}_{int(time.time())}"
-
-        logger.debug("Calling buy_for_item hash_name=%r price=%s partner=%s token=%s",
-                     hash_name, price_cop, partner, token)
-
-        ok, data = buy_for_item(
-            hash_name=hash_name,
-            price=price_cop,
-            partner=partner,
-            token=token,
-            custom_id=custom_id
-        )
-
-        if not ok or not (data.get("success") and (data.get("id") or data.get("data", {}).get("offer_id"))):
-            err = data.get("error") or data.get("message") or f"{item_id}: unknown error"
-            err_msgs.append(f"{item_id}: {err}")
-            continue
-
-        inv_item.pending = True
-        inv_item.save(update_fields=["pending"])
-
-        withdrawal = Withdrawal.objects.create(
-            user=request.user,
-            inventory_item=inv_item,
-            custom_id=custom_id,
-            offer_id = data.get("id") or data.get("data", {}).get("offer_id"),
-            status="pending"
-        )
-        ok_ids.append(inv_item.id)
+    ok_ids, err_msgs = enqueue_withdrawals(request.user, profile, item_ids)
 
     if not ok_ids:
         return JsonResponse({"success": False, "error": "No withdrawals created", "failed": err_msgs}, status=400)
@@ -499,27 +500,25 @@ def buy_for_item_view(request):
 # -----------------------------------------------------------------------------
 def upgrades_view(request):
     """
-    Render upgrade page with user items and available targets.
+    Render upgrade page with user items and the first page of targets.
     """
     if request.user.is_authenticated:
         profile = request.user.profile
         left_items = [
             _item_json(inv, is_inv=True)
-            for inv in InventoryItem.objects.filter(profile=profile)
-        ]
-        right_items = [
-            _item_json(it)
-            for it in Item.objects.all().order_by("-price")[:1000]
+            for inv in InventoryItem.objects.filter(profile=profile).select_related("item__rarity")
         ]
     else:
         profile     = None
         left_items  = []
-        right_items = []
+    # targets are public, so anonymous visitors see them too
+    right_items, next_cursor = _target_page(TARGETS_PAGE_SIZE)
 
     return render(request, "main/upgrades.html", {
         "profile":          profile,
         "left_items_json":  json.dumps(left_items),
         "right_items_json": json.dumps(right_items),
+        "targets_cursor":   next_cursor,
     })
 
 
@@ -535,48 +534,20 @@ def create_upgrade_view(request):
     target_item_id = data.get("target_item_id")
     extra_balance = Decimal(str(data.get("extra_balance", 0)))
 
-    profile = request.user.profile
-    if profile.balance < extra_balance:
+    target_item = get_object_or_404(Item.objects.select_related("rarity"), id=target_item_id)
+    try:
+        res = run_upgrade(request.user, request.user.profile, user_item_ids, target_item, extra_balance)
+    except InsufficientFunds:
         return JsonResponse({"success": False, "message": "Insufficient funds"}, status=400)
-
-    profile.balance -= extra_balance
-    profile.save(update_fields=["balance"])
-
-    used_qs = InventoryItem.objects.filter(profile=profile, id__in=user_item_ids)
-    total_price = sum(inv.item.price for inv in used_qs)
-    used_qs.delete()
-
-    target_item = get_object_or_404(Item, id=target_item_id)
-    attempt_value = total_price + extra_balance
-    chance = min((attempt_value / target_item.price) * 100, 75)
-    is_win = random.uniform(0, 100) <= float(chance)
-
-    result = None
-    if is_win:
-        new_inv = InventoryItem.objects.create(profile=profile, item=target_item)
-        profile.upgrades_count += 1
-        profile.save(update_fields=["upgrades_count"])
-        result = _item_json(new_inv, is_inv=True)
-    else:
-        cashback = attempt_value * Decimal("0.02")
-        profile.balance += cashback
-        profile.save(update_fields=["balance"])
-
-    TransactionLog.objects.create(
-        user=request.user,
-        action_type='upgrade',
-        details=(
-            f"{'Success' if is_win else 'Fail'} upgrade to «{target_item}» "
-            f"(id={target_item.id}), bet {attempt_value:.2f}, chance {chance:.2f}%"
-        )
-    )
+    except TradeError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
 
     return JsonResponse({
         "success": True,
-        "is_win": is_win,
-        "chance_percent": float(chance),
-        "new_balance": float(profile.balance),
-        "result_item": result,
+        "is_win": res["is_win"],
+        "chance_percent": float(res["chance"]),
+        "new_balance": float(res["new_balance"]),
+        "result_item": _item_json(res["new_item"], is_inv=True) if res["new_item"] else None,
     })
 
 
@@ -591,7 +562,7 @@ def contracts_view(request):
         profile = request.user.profile
         left_items = [
             _item_json(inv, is_inv=True)
-            for inv in InventoryItem.objects.filter(profile=profile)
+            for inv in InventoryItem.objects.filter(profile=profile).select_related("item__rarity")
         ]
     else:
         profile = None
@@ -619,59 +590,20 @@ def create_contract_view(request):
     user_item_ids = data.get("user_item_ids", [])
     extra_balance = Decimal(str(data.get("extra_balance", 0)))
 
-    if len(user_item_ids) < 3:
-        return JsonResponse({"success": False, "message": "At least 3 items required"}, status=400)
-
-    profile = request.user.profile
-    if profile.balance < extra_balance:
+    try:
+        res = run_contract(request.user, request.user.profile, user_item_ids, extra_balance)
+    except InsufficientFunds:
         return JsonResponse({"success": False, "message": "Insufficient funds"}, status=400)
-
-    profile.balance -= extra_balance
-    profile.save(update_fields=["balance"])
-
-    used_qs      = InventoryItem.objects.filter(profile=profile, id__in=user_item_ids)
-    total_value  = sum(inv.item.price for inv in used_qs)
-    used_qs.delete()
-
-    attempt = total_value + extra_balance
-    roll    = random.uniform(0, 100)
-    if roll <= 50:
-        mult = 0.5
-    elif roll <= 94:
-        mult = 2
-    elif roll <= 98:
-        mult = 3
-    elif roll <= 98.9:
-        mult = 4
-    else:
-        mult = 5
-
-    result_value = attempt * Decimal(str(mult))
-    low, high    = attempt * Decimal("0.5"), result_value
-    pool         = [i for i in Item.objects.all() if low <= i.price <= high] or \
-                   [min(Item.objects.all(), key=lambda x: abs(x.price - high))]
-    chosen       = random.choice(pool)
-    new_inv      = InventoryItem.objects.create(profile=profile, item=chosen)
-
-    profile.contracts_count += 1
-    profile.save(update_fields=["contracts_count"])
-
-    TransactionLog.objects.create(
-        user=request.user,
-        action_type="contract",
-        details=(
-            f"Contract of {len(user_item_ids)} items (sum {total_value:.2f} + extra {extra_balance:.2f}), "
-            f"mult {mult}, result «{chosen}» (id={chosen.id})"
-        ),
-    )
+    except TradeError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
 
     return JsonResponse(
         {
             "success": True,
-            "multiplier": mult,
-            "contract_result_value": float(result_value),
-            "new_balance": float(profile.balance),
-            "result_item": _item_json(new_inv, is_inv=True),
+            "multiplier": res["multiplier"],
+            "contract_result_value": float(res["result_value"]),
+            "new_balance": float(res["new_balance"]),
+            "result_item": _item_json(res["new_item"], is_inv=True),
         }
     )
 
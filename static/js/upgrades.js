@@ -96,8 +96,8 @@ document.addEventListener('DOMContentLoaded', () => {
   let locked         = false;
   let spinAngle      = 0;
   let loadingTargets = false;
-  let rightOffset    = 0;
-  let noMoreTargets  = false;
+  let rightCursor    = window.targetsCursor;
+  let noMoreTargets  = !rightCursor;
 
   /* === 3. SLIDER INITIALIZATION ============================================= */
   extra.max = Math.floor(parseFloat(extra.getAttribute('max')) || 0);
@@ -198,7 +198,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
   window.leftItems.sort((a, b) => b.price - a.price);
   leftGrid.innerHTML = window.leftItems.map(makeCard).join('');
-  window.rightItems = [];
+  rightGrid.innerHTML = window.rightItems.map(makeCard).join('');
   checkInventoryEmpty();
 
   /* === 7. LAZY LOAD TARGET ITEMS =========================================== */
@@ -207,17 +207,15 @@ document.addEventListener('DOMContentLoaded', () => {
     loadingTargets = true;
     rightOv.classList.add('show');
     try {
-      const url  = `${window.urls.loadTargets}?offset=${rightOffset}&limit=${RIGHT_STEP}`;
+      const url  = `${window.urls.loadTargets}?cursor=${encodeURIComponent(rightCursor)}&limit=${RIGHT_STEP}`;
       const resp = await fetch(url, { headers: { Accept: 'application/json' } });
       if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
       const data = await resp.json();
       if (!data.success) throw new Error('bad JSON');
-      if (!data.items.length) noMoreTargets = true;
-      else {
-        window.rightItems.push(...data.items);
-        rightOffset += data.items.length;
-        rightGrid.insertAdjacentHTML('beforeend', data.items.map(makeCard).join(''));
-      }
+      window.rightItems.push(...data.items);
+      rightGrid.insertAdjacentHTML('beforeend', data.items.map(makeCard).join(''));
+      rightCursor   = data.next_cursor;
+      noMoreTargets = !rightCursor;
     } catch (err) {
       console.error(err);
       alert('Failed to load items:\n' + err.message);
@@ -227,7 +225,6 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
-  loadTargets();
   rightScroll.addEventListener('scroll', () => {
     const { scrollTop, scrollHeight, clientHeight } = rightScroll;
     if (scrollTop + clientHeight > scrollHeight - 300) loadTargets();
@@ -0,0 +1,242 @@
+"""
+Cache backend shared by all processes on a host without an external service.
+
+Entries live in one SQLite file in WAL mode, so gunicorn workers, the
+scheduler and the withdrawal workers see the same values and the same
+invalidations. The file is kept within MAX_ENTRIES and MAX_SIZE by
+evicting expired entries first, then the least recently used ones. The
+totals are only checked on about one write in CULL_EVERY, so the limits
+are soft by a few writes.
+
+    CACHES = {"default": {
+        "BACKEND": "utils.cache_backends.SQLiteCache",
+        "LOCATION": "/path/to/cache.sqlite3",
+        "OPTIONS": {"MAX_ENTRIES": 50000, "MAX_SIZE": 256 * 1024 * 1024, "CULL_EVERY": 100},
+    }}
+"""
+
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+TOUCH_INTERVAL = 1.0  # seconds between LRU timestamp refreshes of one entry
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache ("
+    " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,"
+    " accessed REAL NOT NULL, size INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+)
+
+# -----------------------------------------------------------------------------
+class SQLiteCache(BaseCache):
+    """
+    LRU cache stored in a SQLite-WAL file.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+        options = params.get("OPTIONS", {})
+        self._max_size = int(options.get("MAX_SIZE", 0)) or None
+        self._cull_every = max(int(options.get("CULL_EVERY", 100)), 1)
+        self._local = threading.local()
+
+    # -----------------------------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in SCHEMA:
+                conn.execute(stmt)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, fn):
+        """
+        Run fn(conn) inside an immediate write transaction.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _cull(self, conn, now: float) -> None:
+        """
+        Drop expired entries, then least recently used ones over the limits.
+        Runs the full-table totals on a random 1/CULL_EVERY of the writes.
+        """
+        if self._cull_every > 1 and random.random() * self._cull_every >= 1:
+            return
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if count <= self._max_entries and (self._max_size is None or size <= self._max_size):
+            return
+        conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if count > self._max_entries:
+            # like the other Django backends, free 1/CULL_FREQUENCY at once
+            drop = count - self._max_entries + (count // self._cull_frequency if self._cull_frequency else 0)
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed LIMIT ?)", (drop,)
+            )
+        if self._max_size is not None:
+            size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if size > self._max_size:
+                excess, dropped = size - self._max_size, []
+                for key, entry_size in conn.execute("SELECT key, size FROM cache ORDER BY accessed"):
+                    dropped.append((key,))
+                    excess -= entry_size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM cache WHERE key = ?", dropped)
+
+    def _store(self, conn, key: str, value, timeout, now: float, only_new: bool = False) -> bool:
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        row = (key, blob, self.get_backend_timeout(timeout), now, len(blob))
+        if only_new:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?)", row
+            ).rowcount
+        else:
+            inserted = conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?)", row
+            ).rowcount
+        return bool(inserted)
+
+    # -----------------------------------------------------------------------------
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {}
+        for key in keys:
+            k = self.make_and_validate_key(key, version=version)
+            key_map[k] = key
+        now = time.time()
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._conn().execute(
+            f"SELECT key, value, expires, accessed FROM cache WHERE key IN ({placeholders})",
+            list(key_map),
+        ).fetchall()
+
+        result, stale = {}, []
+        for k, blob, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            result[key_map[k]] = pickle.loads(blob)
+            if now - accessed > TOUCH_INTERVAL:
+                stale.append((now, k))
+        if stale:
+            try:
+                self._write(lambda conn: conn.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", stale
+                ))
+            except sqlite3.OperationalError:
+                pass  # LRU order is best effort; never fail a read on a busy file
+        return result
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def run(conn):
+            self._store(conn, key, value, timeout, now)
+            self._cull(conn, now)
+        self._write(run)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [(self.make_and_validate_key(k, version=version), v) for k, v in data.items()]
+
+        def run(conn):
+            for key, value in rows:
+                self._store(conn, key, value, timeout, now)
+            self._cull(conn, now)
+        self._write(run)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def run(conn):
+            added = self._store(conn, key, value, timeout, now, only_new=True)
+            if added:
+                self._cull(conn, now)
+            return added
+        return self._write(run)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def run(conn):
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                "UPDATE cache SET value = ?, size = ?, accessed = ? WHERE key = ?",
+                (blob, len(blob), now, key),
+            )
+            return value
+        return self._write(run)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        return bool(self._write(lambda conn: conn.execute(
+            "UPDATE cache SET expires = ?, accessed = ? "
+            "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._write(lambda conn: conn.execute(
+            "DELETE FROM cache WHERE key = ?", (key,)
+        ).rowcount))
+
+    def delete_many(self, keys, version=None):
+        keys = [(self.make_and_validate_key(k, version=version),) for k in keys]
+        if keys:
+            self._write(lambda conn: conn.executemany("DELETE FROM cache WHERE key = ?", keys))
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._conn().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write(lambda conn: conn.execute("DELETE FROM cache"))
+
+    def close(self, **kwargs):
+        # connections are reused per thread for the life of the process
+        pass
@@ -0,0 +1,52 @@
+"""
+Version tokens for cached derived data (drop tables, catalogues, payloads).
+
+Cached values are stored under keys that embed the current token, so an
+invalidation only has to replace the token; old entries simply expire.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+CASE_VERSION_KEY = "case_version:{case_id}"
+VERSION_TTL = None  # never expire; tokens are replaced on invalidation
+
+# -----------------------------------------------------------------------------
+def get_version(key: str) -> str:
+    """
+    Return the current version token stored under key, creating one if missing.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+# -----------------------------------------------------------------------------
+def bump_versions(keys) -> None:
+    """
+    Issue new version tokens for all given keys once the current
+    transaction commits (immediately outside a transaction), so readers
+    never rebuild a cached value from rows that are not yet visible.
+    """
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, VERSION_TTL)
+        )
+
+# -----------------------------------------------------------------------------
+def get_case_version(case_id: int) -> str:
+    """
+    Return the current version token for a case.
+    """
+    return get_version(CASE_VERSION_KEY.format(case_id=case_id))
+
+# -----------------------------------------------------------------------------
+def bump_case_versions(case_ids) -> None:
+    """
+    Invalidate all cached data of the given cases.
+    """
+    bump_versions(CASE_VERSION_KEY.format(case_id=cid) for cid in case_ids)
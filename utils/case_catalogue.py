@@ -0,0 +1,193 @@
+"""
+Snapshot of all active cases for the case list and search endpoints.
+
+Cases are loaded once with their item counts and sections, serialized to
+plain dicts and cached under a version token, so list pages and searches
+are answered from memory. The token is bumped by signals whenever a Case,
+CaseItem or CaseSection changes.
+
+Title searches go through an n-gram index (all 1-, 2- and 3-grams of each
+title), so autocomplete only touches cases sharing the term's n-grams.
+Price-range filtering with ordering is pushed to the database instead.
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, QuerySet
+
+from main.models import Case
+from utils.cache_versions import bump_versions, get_version
+
+CATALOGUE_VERSION_KEY = "case_catalogue_version"
+CATALOGUE_KEY = "case_catalogue:{version}"
+CATALOGUE_TTL = 60 * 60 * 24
+NGRAM_SIZE = 3
+
+# ordering values accepted by filter_cases
+CASE_ORDERINGS = ("id", "price", "-price", "title", "-title")
+
+# (version, CaseCatalogue) of this process
+_local_catalogue: tuple[str, "CaseCatalogue"] | None = None
+
+# -----------------------------------------------------------------------------
+class CaseCatalogue:
+    """
+    Serialized active cases ordered by section.
+    """
+    __slots__ = ("cases", "grams", "slugs")
+
+    def __init__(self, cases: list[dict]) -> None:
+        self.cases = cases
+        self.grams: dict[str, list[int]] = {}
+        self.slugs: dict[str, int] = {}
+        for pos, case in enumerate(cases):
+            self.slugs[case["slug"]] = pos
+            for gram in ngrams(case["title_lower"]):
+                self.grams.setdefault(gram, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+    def get(self, slug: str) -> dict | None:
+        """
+        Return the entry of the active case with the given slug, or None.
+        """
+        pos = self.slugs.get(slug)
+        return None if pos is None else self.cases[pos]
+
+    def _matches(self, term: str) -> list[int]:
+        """
+        Return catalogue positions of cases whose title contains term.
+        """
+        if not term:
+            return list(range(len(self.cases)))
+        postings = [self.grams.get(g) for g in ngrams(term, min_size=NGRAM_SIZE)]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        found = set(postings[0]).intersection(*postings[1:])
+        if len(term) > NGRAM_SIZE:
+            found = {pos for pos in found if term in self.cases[pos]["title_lower"]}
+        return sorted(found)
+
+    def search(
+        self,
+        term: str = "",
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> tuple[list[dict], int]:
+        """
+        Return one page of JSON dicts of cases whose title contains term,
+        and the total number of matches.
+        """
+        found = self._matches(term.lower())
+        end = None if limit is None else offset + limit
+        return [self.cases[pos]["json"] for pos in found[offset:end]], len(found)
+
+
+# -----------------------------------------------------------------------------
+def ngrams(text: str, min_size: int = 1) -> set[str]:
+    """
+    Return the n-grams of text for n in [min_size, NGRAM_SIZE]; texts shorter
+    than min_size yield themselves.
+    """
+    min_size = min(min_size, len(text))
+    return {
+        text[i:i + n]
+        for n in range(max(min_size, 1), NGRAM_SIZE + 1)
+        for i in range(len(text) - n + 1)
+    }
+
+# -----------------------------------------------------------------------------
+def case_entry(case: Case) -> dict:
+    """
+    Serialize a Case annotated with n_items (and its section) to a dict.
+    """
+    box_image = case.box_image.url if case.box_image else ""
+    section = case.section
+    return {
+        "id":          case.id,
+        "title":       case.title,
+        "title_lower": case.title.lower(),
+        "slug":        case.slug,
+        "price":       case.price,
+        "old_price":   case.old_price,
+        "item_count":  case.n_items,
+        "box_image":   box_image,
+        "section":     {"id": section.id, "name": section.name} if section else None,
+        "json": {
+            "id":         case.id,
+            "title":      case.title,
+            "price":      f"{case.price:.2f}",
+            "old_price":  f"{case.old_price:.2f}" if case.old_price else None,
+            "slug":       case.slug,
+            "item_count": case.n_items,
+            "box_image":  box_image,
+        },
+    }
+
+# -----------------------------------------------------------------------------
+def build_case_catalogue() -> CaseCatalogue:
+    """
+    Load all active cases with item counts and sections in one query.
+    """
+    qs = (
+        Case.objects.filter(active=True)
+        .select_related("section")
+        .annotate(n_items=Count("case_items"))
+        .order_by("section__id", "id")
+    )
+    return CaseCatalogue([case_entry(c) for c in qs])
+
+# -----------------------------------------------------------------------------
+def filter_cases(
+    term: str = "",
+    min_price: Decimal | None = None,
+    max_price: Decimal | None = None,
+    ordering: str = "id",
+) -> QuerySet:
+    """
+    Return active cases filtered by title term and price range in the
+    database, annotated with n_items.
+    """
+    qs = Case.objects.filter(active=True)
+    if term:
+        qs = qs.filter(title__icontains=term)
+    if min_price is not None:
+        qs = qs.filter(price__gte=min_price)
+    if max_price is not None:
+        qs = qs.filter(price__lte=max_price)
+    if ordering not in CASE_ORDERINGS:
+        ordering = "id"
+    return (
+        qs.select_related("section")
+        .annotate(n_items=Count("case_items"))
+        .order_by(ordering, "id")
+    )
+
+# -----------------------------------------------------------------------------
+def get_case_catalogue() -> CaseCatalogue:
+    """
+    Return the case catalogue, rebuilding it only when stale.
+    """
+    global _local_catalogue
+    version = get_version(CATALOGUE_VERSION_KEY)
+    if _local_catalogue and _local_catalogue[0] == version:
+        return _local_catalogue[1]
+
+    key = CATALOGUE_KEY.format(version=version)
+    catalogue = cache.get(key)
+    if catalogue is None:
+        catalogue = build_case_catalogue()
+        cache.set(key, catalogue, CATALOGUE_TTL)
+
+    _local_catalogue = (version, catalogue)
+    return catalogue
+
+# -----------------------------------------------------------------------------
+def bump_case_catalogue() -> None:
+    """
+    Mark the case catalogue stale in every process.
+    """
+    bump_versions([CATALOGUE_VERSION_KEY])
@@ -2,19 +2,33 @@
 This module adds items from wiki.cs.money cases into our Django application.
 """
 
+import hashlib
 import os
 import re
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from lxml import html
 from urllib.parse import urlparse
-from requests.exceptions import SSLError, RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import connection, transaction
 
 from main.models import Item, CaseItem, Case, Rarity
+from utils.cache_versions import bump_case_versions
+from utils.case_catalogue import bump_case_catalogue
+from utils.price_catalogue import bump_price_catalogue
 from utils.utils import compute_drop_chance
 
 USER_AGENT = "Mozilla/5.0 (importer)"
+IMAGE_WORKERS = getattr(settings, "IMPORT_IMAGE_WORKERS", 8)
+IMPORT_WORKERS = getattr(settings, "IMPORT_WORKERS", 4)  # cases imported at once
+
+_session: requests.Session | None = None
+_apply_lock = threading.Lock()
 
 class CaseImporterError(Exception):
     """Raised when the importer cannot find or parse any items."""
@@ -30,6 +44,79 @@ RARITY_ORDER = {
 }
 
 
+def get_session() -> requests.Session:
+    """
+    Return the importer's shared HTTP session, sized for the image pool.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_WORKERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def _download(url: str) -> bytes | None:
+    """
+    Download one image, returning None on failure.
+    """
+    try:
+        resp = get_session().get(url, timeout=10)
+        resp.raise_for_status()
+    except RequestException:
+        return None
+    return resp.content
+
+
+def store_images(pending: list[tuple[Item, str]]) -> int:
+    """
+    Download images for (item, image_url) pairs through a bounded thread
+    pool and store them under content-addressed names, so identical
+    images share one file. Returns the number of items given an image.
+    """
+    if not pending:
+        return 0
+
+    field = Item._meta.get_field("image")
+    urls = list(dict.fromkeys(url for _, url in pending))
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        blobs = pool.map(_download, urls)
+
+        names = {}
+        for url, data in zip(urls, blobs):
+            if not data:
+                continue
+            ext = os.path.splitext(urlparse(url).path)[1].lower()
+            name = f"{field.upload_to}{hashlib.sha256(data).hexdigest()}{ext}"
+            if not field.storage.exists(name):
+                name = field.storage.save(name, ContentFile(data))
+            names[url] = name
+
+    updated = []
+    for item, url in pending:
+        if url in names:
+            item.image.name = names[url]
+            updated.append(item)
+
+    Item.objects.bulk_update(updated, ["image"])
+    bump_case_versions(
+        CaseItem.objects.filter(item__in=updated).values_list("case_id", flat=True).distinct()
+    )
+    return len(updated)
+
+
+def fetch_page(url: str) -> bytes:
+    """
+    Download a page with the shared session, raising on HTTP errors.
+    """
+    resp = get_session().get(url, timeout=10)
+    resp.raise_for_status()
+    return resp.content
+
+
 def parse_card(a, special_kind=None) -> dict:
     """
     Extract item data from a case card element.
@@ -84,13 +171,11 @@ def parse_card(a, special_kind=None) -> dict:
     }
 
 
-def fetch_case_items_from_cs_money(url: str) -> list[dict]:
+def fetch_case_items_from_cs_money(url: str, fetch=fetch_page) -> list[dict]:
     """
     Request the case page and parse all normal items.
     """
-    resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
-    resp.raise_for_status()
-    tree = html.fromstring(resp.content)
+    tree = html.fromstring(fetch(url))
     cards = tree.xpath('//a[contains(@class,"blzuifkxmlnzwzwpwjzrrtwcse")]')
     if not cards:
         raise CaseImporterError(f"No cards found on {url}")
@@ -106,19 +191,18 @@ def fetch_case_items_from_cs_money(url: str) -> list[dict]:
     return items
 
 
-def fetch_special_items(case_url: str, kind: str) -> list[dict]:
+def fetch_special_items(case_url: str, kind: str, fetch=fetch_page) -> list[dict]:
     """
     Fetch and parse special items (knives, gloves) from subpages.
     De-duplicate by weapon name, keeping the cheapest.
     """
     url = case_url.rstrip("/") + f"/{kind}"
     try:
-        resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
-        resp.raise_for_status()
+        content = fetch(url)
     except Exception:
         return []
 
-    tree = html.fromstring(resp.content)
+    tree = html.fromstring(content)
     anchors = tree.xpath(
         '//div[contains(@class,"gasovxczmdwrpzliptyovkjrjp")]'
         '//a[contains(@class,"blzuifkxmlnzwzwpwjzrrtwcse")]'
@@ -138,21 +222,60 @@ def fetch_special_items(case_url: str, kind: str) -> list[dict]:
     return list(unique.values())
 
 
-def import_case_from_url(case: Case, url: str) -> tuple[int, list[str]]:
+class ImportReport:
     """
-    Main entry: import all items for a given Case model from a wiki.cs.money URL.
-    Returns a tuple of (imported_count, list_of_error_messages).
+    Outcome of one case import.
     """
-    errors = []
-
-    try:
-        items = fetch_case_items_from_cs_money(url)
-    except CaseImporterError as e:
-        return 0, [str(e)]
+    def __init__(self, case: Case, url: str = "") -> None:
+        self.case = case
+        self.url = url
+        self.items_created = 0
+        self.items_updated = 0
+        self.items_unchanged = 0
+        self.rarities_created = 0
+        self.links_created = 0
+        self.links_updated = 0
+        self.images_stored = 0
+        self.errors: list[str] = []
+
+    @property
+    def count(self) -> int:
+        """Number of items imported into the case."""
+        return self.items_created + self.items_updated + self.items_unchanged
+
+    def as_dict(self) -> dict:
+        return {
+            "case":             self.case.slug,
+            "url":              self.url,
+            "count":            self.count,
+            "items_created":    self.items_created,
+            "items_updated":    self.items_updated,
+            "items_unchanged":  self.items_unchanged,
+            "rarities_created": self.rarities_created,
+            "links_created":    self.links_created,
+            "links_updated":    self.links_updated,
+            "images_stored":    self.images_stored,
+            "errors":           self.errors,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.case}: {self.count} items ({self.items_created} new, "
+            f"{self.items_updated} updated), {self.links_created} linked, "
+            f"{self.images_stored} images, {len(self.errors)} errors"
+        )
+
+
+def collect_case_items(url: str, fetch=fetch_page) -> list[dict]:
+    """
+    Fetch the normal, knife and glove items of a case page, sorted by rarity.
+    fetch(url) -> bytes retrieves each page (a PageCache.fetch for example).
+    """
+    items = fetch_case_items_from_cs_money(url, fetch)
 
     # Include knives and gloves
-    items += fetch_special_items(url, "knives")
-    items += fetch_special_items(url, "gloves")
+    items += fetch_special_items(url, "knives", fetch)
+    items += fetch_special_items(url, "gloves", fetch)
 
     # Sort items by rarity order
     def sort_key(it):
@@ -162,64 +285,167 @@ def import_case_from_url(case: Case, url: str) -> tuple[int, list[str]]:
             return RARITY_ORDER["glove"]
         return RARITY_ORDER.get(it["rarity"], max(RARITY_ORDER.values()) + 1)
     items.sort(key=sort_key)
+    return items
 
-    count = 0
-    for data in items:
-        try:
-            # Create or update Item record
-            item, created = Item.objects.get_or_create(
-                weapon_name=data["weapon_name"],
-                skin_name=data["skin_name"] or None,
-                defaults={
-                    "price":            data["price"],
-                    "market_hash_name": data["market_hash_name"] or None,
-                },
-            )
-            changed = False
+
+def _ensure_rarities(names) -> tuple[dict[str, Rarity], int]:
+    """
+    Map lower-cased rarity names to Rarity rows, creating missing ones.
+    """
+    rarities = {r.name.lower(): r for r in Rarity.objects.all()}
+    missing = {}
+    for name in names:
+        if name and name.lower() not in rarities:
+            missing.setdefault(name.lower(), Rarity(name=name, color="#ffffff"))
+    if missing:
+        Rarity.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        rarities.update(
+            (r.name.lower(), r)
+            for r in Rarity.objects.filter(name__in=[r.name for r in missing.values()])
+        )
+    return rarities, len(missing)
+
+
+def apply_case_items(case: Case, items: list[dict], report: ImportReport) -> list[tuple[Item, str]]:
+    """
+    Upsert scraped items and their CaseItem links for a case in bulk.
+    Existing Items, Rarities and CaseItems are preloaded with one query
+    each and only differences are written. Returns the (item, image_url)
+    pairs of items that still need an image.
+    """
+    # last scraped card wins for duplicate (weapon, skin) pairs
+    scraped = {(d["weapon_name"], d["skin_name"] or None): d for d in items}
+
+    existing = {}
+    for item in Item.objects.filter(
+        weapon_name__in={w for w, _ in scraped}
+    ).order_by("-id"):
+        existing[(item.weapon_name, item.skin_name)] = item  # lowest id wins
+
+    with transaction.atomic():
+        rarities, report.rarities_created = _ensure_rarities(d["rarity"] for d in scraped.values())
+
+        new_items, changed_items, fields = [], [], set()
+        for key, data in scraped.items():
+            rarity = rarities.get((data["rarity"] or "").lower())
+            item = existing.get(key)
+            if item is None:
+                item = Item(
+                    weapon_name=key[0],
+                    skin_name=key[1],
+                    price=data["price"],
+                    market_hash_name=data["market_hash_name"] or None,
+                    rarity=rarity,
+                )
+                new_items.append(item)
+                existing[key] = item
+                continue
+
+            changed = set()
             if item.price != data["price"]:
                 item.price = data["price"]
-                changed = True
+                changed.add("price")
             if not item.market_hash_name and data["market_hash_name"]:
                 item.market_hash_name = data["market_hash_name"]
-                changed = True
+                changed.add("market_hash_name")
+            if rarity and item.rarity_id != rarity.id:
+                item.rarity = rarity
+                changed.add("rarity")
             if changed:
-                item.save(update_fields=["price", "market_hash_name"])
+                changed_items.append(item)
+                fields |= changed
+            else:
+                report.items_unchanged += 1
+
+        Item.objects.bulk_create(new_items)
+        if changed_items:
+            Item.objects.bulk_update(changed_items, sorted(fields))
+        report.items_created = len(new_items)
+        report.items_updated = len(changed_items)
+
+        links = {}
+        for ci in CaseItem.objects.filter(case=case).order_by("-id"):
+            links[ci.item_id] = ci  # lowest id wins
+        new_links, changed_links = [], []
+        for key, data in scraped.items():
+            item = existing[key]
+            try:
+                chance = compute_drop_chance(case.price, data["price"])
+            except (ArithmeticError, ValueError) as e:
+                report.errors.append(f"{data['weapon_name']}: {e}")
+                continue
+            ci = links.get(item.id)
+            if ci is None:
+                new_links.append(CaseItem(case=case, item=item, drop_chance=chance))
+            elif ci.drop_chance != chance or ci.never_drop:
+                ci.drop_chance, ci.never_drop = chance, False
+                changed_links.append(ci)
+
+        CaseItem.objects.bulk_create(new_links)
+        CaseItem.objects.bulk_update(changed_links, ["drop_chance", "never_drop"])
+        report.links_created = len(new_links)
+        report.links_updated = len(changed_links)
+
+    # bulk writes bypass the model signals
+    if new_items or "price" in fields:
+        bump_price_catalogue()
+    bump_case_versions(
+        {case.id, *CaseItem.objects.filter(item__in=changed_items).values_list("case_id", flat=True)}
+    )
+    if new_links:
+        bump_case_catalogue()
 
-            # Ensure Rarity exists and assign it
-            rar = Rarity.objects.filter(name__iexact=data["rarity"]).first()
-            if not rar:
-                rar = Rarity.objects.create(name=data["rarity"], color="#ffffff")
-            if item.rarity_id != rar.id:
-                item.rarity = rar
-                item.save(update_fields=["rarity"])
+    return [
+        (existing[key], data["image_url"])
+        for key, data in scraped.items()
+        if data["image_url"] and not existing[key].image
+    ]
 
-            # Download and save the image
-            try:
-                img_resp = requests.get(
-                    data["image_url"],
-                    headers={"User-Agent": USER_AGENT},
-                    timeout=10,
-                )
-                img_resp.raise_for_status()
-                filename = os.path.basename(data["image_url"].split("?", 1)[0])
-                item.image.save(filename, ContentFile(img_resp.content), save=False)
-                item.save(update_fields=["image"])
-            except (SSLError, RequestException):
-                pass
-
-            # Link item to the Case and compute drop chance
-            ci, _ = CaseItem.objects.update_or_create(
-                case=case,
-                item=item,
-                defaults={"never_drop": False},
-            )
-            chance = compute_drop_chance(case.price, data["price"])
-            ci.drop_chance = chance
-            ci.save(update_fields=["drop_chance"])
-
-            count += 1
 
+def import_case_from_url(case: Case, url: str, fetch=fetch_page) -> ImportReport:
+    """
+    Main entry: import all items for a given Case model from a wiki.cs.money URL.
+    Returns an ImportReport; fetch and parse failures end up in its errors.
+    """
+    report = ImportReport(case, url)
+    try:
+        items = collect_case_items(url, fetch)
+    except CaseImporterError as e:
+        report.errors.append(str(e))
+        return report
+    except (RequestException, LookupError) as e:
+        report.errors.append(f"{url}: {e!r}")
+        return report
+
+    # concurrent imports fetch in parallel but write one at a time
+    with _apply_lock:
+        pending_images = apply_case_items(case, items, report)
+    report.images_stored = store_images(pending_images)
+    return report
+
+
+def import_cases(jobs: list[tuple[Case, str]], workers: int = IMPORT_WORKERS, fetch=fetch_page) -> list[ImportReport]:
+    """
+    Import several (case, url) pairs concurrently, sharing fetch (usually a
+    PageCache) so subpages common to many cases are downloaded once.
+    Returns one ImportReport per job, in order.
+    """
+    def run(job):
+        case, url = job
+        try:
+            return import_case_from_url(case, url, fetch)
         except Exception as e:
-            errors.append(f"{data['weapon_name']}: {e}")
+            report = ImportReport(case, url)
+            report.errors.append(f"{url}: {e!r}")
+            return report
 
-    return count, errors
+    def run_threaded(job):
+        try:
+            return run(job)
+        finally:
+            connection.close()
+
+    if workers <= 1:
+        return [run(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_threaded, jobs))
@@ -0,0 +1,66 @@
+"""
+Pre-rendered case detail payloads.
+
+Everything on a case page except the visitor's balance is identical for
+all users, so the case metadata and the serialized item list are built
+once per case version and kept in the cache. Price, chance and item
+changes bump the case version, which retires the old payload.
+"""
+
+import json
+
+from django.core.cache import cache
+
+from main.models import Case
+from utils.cache_versions import get_case_version
+
+PAGE_KEY = "case_page:{case_id}:{version}"
+PAGE_TTL = 60 * 60 * 24
+
+# -----------------------------------------------------------------------------
+def build_case_page(case_id: int) -> dict | None:
+    """
+    Build the static part of a case page, or None if the case is not active.
+    """
+    case = Case.objects.filter(pk=case_id, active=True).first()
+    if case is None:
+        return None
+
+    case_items = []
+    for ci in case.case_items.select_related("item__rarity"):
+        item = ci.item
+        rarity = item.rarity
+        case_items.append({
+            'id': item.id,
+            'weapon_name': item.weapon_name,
+            'skin_name': item.skin_name or '',
+            'image_url': item.image.url if item.image else '',
+            'rarity': rarity.name if rarity else None,
+            'rarity_color': rarity.color if rarity else '#ffffff',
+            'rarity_color_full': (rarity.color + "80") if rarity else "#ffffff80",
+            'rarity_color_light': (rarity.color + "33") if rarity else "#ffffff33",
+            'drop_chance': ci.drop_chance,
+            'price': float(item.price),
+        })
+    return {
+        "case": {
+            "id":    case.id,
+            "title": case.title,
+            "slug":  case.slug,
+            "price": case.price,
+        },
+        "case_items_json": json.dumps(case_items),
+    }
+
+# -----------------------------------------------------------------------------
+def get_case_page(case_id: int) -> dict | None:
+    """
+    Return the cached static part of a case page, building it when stale.
+    """
+    key = PAGE_KEY.format(case_id=case_id, version=get_case_version(case_id))
+    page = cache.get(key)
+    if page is None:
+        page = build_case_page(case_id)
+        if page is not None:
+            cache.set(key, page, PAGE_TTL)
+    return page
@@ -2,61 +2,172 @@ from __future__ import annotations
 from django.conf import settings
 
 import logging
+import queue
 import threading
 import time
+from contextlib import contextmanager
 from typing import Tuple
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.rate_limit import (
+    PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, build_rate_limiter,
+)
 
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://market.csgo.com/api/v2"
 API_KEY  = settings.MARKETCSGO_API_KEY
 
+POOL_SIZE      = getattr(settings, "MARKET_API_POOL_SIZE", 8)
+MAX_RETRIES    = getattr(settings, "MARKET_API_MAX_RETRIES", 3)
+BACKOFF        = getattr(settings, "MARKET_API_BACKOFF", 0.5)
+MAX_RETRY_DELAY = getattr(settings, "MARKET_API_MAX_RETRY_DELAY", 5)  # seconds
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Single shared limiter: max 5 calls per second across all processes
+rate_limiter = build_rate_limiter(
+    getattr(settings, "MARKET_API_RATE_LIMITER", "local"),
+    rate=getattr(settings, "MARKET_API_RATE", 5),
+    per=1,
+    path=getattr(settings, "MARKET_API_RATE_LIMIT_PATH", None),
+    name="market",
+)
+
 # -----------------------------------------------------------------------------
-class RateLimiter:
+class SessionPool:
     """
-    Simple token-bucket rate limiter to throttle API requests.
+    Thread-safe pool of keep-alive sessions; each session is used by one
+    thread at a time and retries failed connects on its own.
     """
-    def __init__(self, rate: int, per: int) -> None:
-        # rate: number of tokens, per: time window in seconds
-        self.rate = rate
-        self.per = per
-        self.allowance = rate
-        self.last_check = time.time()
-        self.lock = threading.Lock()
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
 
     # -----------------------------------------------------------------------------
-    def wait(self) -> None:
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            # only retry connects here: the request has not reached the market yet
+            max_retries=Retry(total=MAX_RETRIES, connect=MAX_RETRIES, read=0,
+                              status=0, backoff_factor=BACKOFF),
+        )
+        session.mount("https://", adapter)
+        session.headers["Accept"] = "application/json"
+        return session
+
+    # -----------------------------------------------------------------------------
+    @contextmanager
+    def session(self):
         """
-        Block until a request is allowed under the rate limit.
+        Borrow a session, blocking while all pool slots are in use.
         """
-        with self.lock:
-            now = time.time()
-            # Refill tokens
-            self.allowance += (now - self.last_check) * (self.rate / self.per)
-            self.allowance = min(self.allowance, self.rate)
-            self.last_check = now
+        try:
+            sess = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            sess = self._new_session() if create else self._idle.get()
+        try:
+            yield sess
+        finally:
+            self._idle.put(sess)
+
+
+# -----------------------------------------------------------------------------
+class EndpointStats:
+    """
+    Thread-safe per-endpoint call, error and latency counters.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: dict[str, dict] = {}
+
+    def record(self, endpoint: str, elapsed_ms: float, error: bool, retries: int) -> None:
+        with self._lock:
+            row = self._data.setdefault(endpoint, {
+                "calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0,
+            })
+            row["calls"] += 1
+            row["errors"] += int(error)
+            row["retries"] += retries
+            row["total_ms"] += elapsed_ms
+            row["max_ms"] = max(row["max_ms"], elapsed_ms)
 
-            # If no tokens, sleep until one is available
-            if self.allowance < 1:
-                sleep_time = (1 - self.allowance) * (self.per / self.rate)
-                time.sleep(sleep_time)
-                self.allowance = 0
-            else:
-                self.allowance -= 1
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                name: {**row, "avg_ms": row["total_ms"] / row["calls"]}
+                for name, row in self._data.items()
+            }
 
 
-# Single shared limiter: max 5 calls per second
-rate_limiter = RateLimiter(rate=5, per=1)
+session_pool = SessionPool(POOL_SIZE)
+api_stats = EndpointStats()
 
 # -----------------------------------------------------------------------------
-def _req(method: str, url: str, **kw) -> requests.Response:
+def get_api_stats() -> dict[str, dict]:
     """
-    Wrapper around requests.request that applies rate limiting.
+    Return per-endpoint counters: calls, errors, retries, total/avg/max latency.
     """
-    rate_limiter.wait()
-    return requests.request(method, url, **kw)
+    return api_stats.snapshot()
+
+# -----------------------------------------------------------------------------
+def _retry_delay(response: requests.Response | None, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt, honouring Retry-After up to
+    MAX_RETRY_DELAY so a worker or request thread is never parked for long.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_DELAY)
+    return min(BACKOFF * (2 ** attempt), MAX_RETRY_DELAY)
+
+# -----------------------------------------------------------------------------
+def _req(
+    method: str,
+    url: str,
+    *,
+    idempotent: bool = True,
+    priority: int = PRIORITY_NORMAL,
+    **kw,
+) -> requests.Response:
+    """
+    Rate-limited request through the session pool. Idempotent calls are
+    retried with exponential backoff on 429/5xx responses and timeouts.
+    """
+    endpoint = urlparse(url).path.rsplit("/", 1)[-1]
+    attempts = 1 + (MAX_RETRIES if idempotent else 0)
+    started = time.monotonic()
+    retries, error = 0, True
+    try:
+        for attempt in range(attempts):
+            rate_limiter.wait(priority)
+            response = None
+            try:
+                with session_pool.session() as sess:
+                    response = sess.request(method, url, **kw)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt + 1 >= attempts:
+                    raise
+            if response is not None and (
+                response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts
+            ):
+                error = response.status_code >= 400
+                return response
+            retries += 1
+            time.sleep(_retry_delay(response, attempt))
+    finally:
+        api_stats.record(endpoint, (time.monotonic() - started) * 1000, error, retries)
 
 # -----------------------------------------------------------------------------
 def get_lowest_price(hash_name: str) -> Tuple[bool, int]:
@@ -117,7 +228,7 @@ def buy_for_item(
         params["custom_id"] = custom_id
 
     url = f"{BASE_URL}/buy-for"
-    r = _req("GET", url, params=params, timeout=15)
+    r = _req("GET", url, params=params, timeout=15, idempotent=False, priority=PRIORITY_HIGH)
 
     if r.status_code == 200:
         data = r.json()
@@ -130,7 +241,9 @@ def buy_for_item(
 def get_buy_info_by_custom_id(custom_id: str) -> Tuple[bool, dict]:
     """
     Retrieve the status and details of a prior buy-for request by its custom_id.
-    Returns (success, data) where data includes stage and status.
+    Returns (success, data) where data includes stage and status. When the
+    market does not know the custom_id, data is its reply with "success":
+    False; on network or HTTP errors it only holds "error".
     """
     url = (
         f"{BASE_URL}/get-buy-info-by-custom-id?"
@@ -155,7 +268,7 @@ def get_list_buy_info_by_custom_ids(custom_ids: list[str]) -> tuple[bool, dict]:
     """
     url = f"{BASE_URL}/get-list-buy-info-by-custom-id"
     params = [("key", API_KEY)] + [("custom_id[]", cid) for cid in custom_ids]
-    r = _req("GET", url, params=params, timeout=10)
+    r = _req("GET", url, params=params, timeout=10, priority=PRIORITY_LOW)
     if r.status_code != 200:
         return False, {}
 
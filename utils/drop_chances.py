@@ -0,0 +1,65 @@
+"""
+Batch recomputation of CaseItem drop chances.
+
+The chance of every CaseItem in every case is exp(-k * (ratio - 1)) with
+ratio = item price / case price (1.0 when the item is not dearer than the
+case), the same model as utils.utils.compute_drop_chance. All rows are
+computed in one NumPy pass over price arrays and only changed rows are
+written back with bulk_update.
+"""
+
+import logging
+
+import numpy as np
+from django.db import transaction
+
+from main.models import CaseItem
+from utils.cache_versions import bump_case_versions
+from utils.utils import DROP_CHANCE_FLOOR, DROP_CHANCE_STEEPNESS
+
+logger = logging.getLogger(__name__)
+
+UPDATE_BATCH = 1000
+
+# -----------------------------------------------------------------------------
+def drop_chances(case_prices: np.ndarray, item_prices: np.ndarray) -> np.ndarray:
+    """
+    Vectorised compute_drop_chance over parallel price arrays.
+    """
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        ratio = item_prices / case_prices
+        chances = np.exp(-DROP_CHANCE_STEEPNESS * (ratio - 1))
+    chances = np.maximum(chances, DROP_CHANCE_FLOOR)
+    return np.where(ratio <= 1, 1.0, chances)
+
+# -----------------------------------------------------------------------------
+def recompute_drop_chances(case_ids=None) -> dict:
+    """
+    Recompute the drop chances of all CaseItems (or those of case_ids) and
+    store the ones that changed. Returns a report dict.
+    """
+    qs = CaseItem.objects.all()
+    if case_ids is not None:
+        qs = qs.filter(case_id__in=list(case_ids))
+    rows = list(qs.values_list("id", "case_id", "case__price", "item__price", "drop_chance"))
+    if not rows:
+        return {"checked": 0, "updated": 0, "cases": 0}
+
+    ids, cases, case_prices, item_prices, current = zip(*rows)
+    chances = drop_chances(
+        np.array(case_prices, dtype=float), np.array(item_prices, dtype=float)
+    )
+    # a zero-priced case has no meaningful chance; keep what is stored
+    chances = np.where(np.array(case_prices, dtype=float) > 0, chances, current)
+    # ignore last-digit float differences to the scalar formula
+    changed = np.flatnonzero(~np.isclose(chances, np.array(current, dtype=float), rtol=1e-12, atol=0))
+
+    updates = [CaseItem(id=ids[i], drop_chance=float(chances[i])) for i in changed]
+    with transaction.atomic():
+        CaseItem.objects.bulk_update(updates, ["drop_chance"], batch_size=UPDATE_BATCH)
+    changed_cases = {cases[i] for i in changed}
+    bump_case_versions(changed_cases)
+
+    report = {"checked": len(rows), "updated": len(updates), "cases": len(changed_cases)}
+    logger.info("recompute_drop_chances: %s", report)
+    return report
@@ -0,0 +1,106 @@
+"""
+Compiled per-case drop tables used by case spins.
+
+A table holds the droppable items of a case together with a cumulative
+weight array, so a spin picks an item with a single bisect and no queries.
+Tables are cached in-process and in the shared cache, keyed by case version.
+"""
+
+import random
+from bisect import bisect_right
+
+from django.core.cache import cache
+
+from main.models import CaseItem
+from utils.cache_versions import get_case_version
+
+TABLE_KEY = "drop_table:{case_id}:{version}"
+TABLE_TTL = 60 * 60 * 24
+
+# case_id -> (version, DropTable)
+_local_tables: dict[int, tuple[str, "DropTable"]] = {}
+
+# -----------------------------------------------------------------------------
+class DropTable:
+    """
+    Immutable weighted item table with O(log n) sampling.
+    """
+    __slots__ = ("entries", "cum_weights", "total")
+
+    def __init__(self, entries: list[dict], weights: list[float]) -> None:
+        self.entries = entries
+        self.cum_weights = []
+        total = 0.0
+        for w in weights:
+            total += max(w, 0.0)
+            self.cum_weights.append(total)
+        self.total = total
+
+    def __len__(self) -> int:
+        return len(self.entries) if self.total > 0 else 0
+
+    def pick(self, rng: random.Random = random) -> dict:
+        """
+        Return one entry chosen proportionally to its drop chance.
+        """
+        idx = bisect_right(self.cum_weights, rng.random() * self.total)
+        return self.entries[min(idx, len(self.entries) - 1)]
+
+    def sample(self, k: int, rng: random.Random = random) -> list[dict]:
+        """
+        Return k independent draws in a single pass over the cumulative weights.
+        """
+        return rng.choices(self.entries, cum_weights=self.cum_weights, k=k)
+
+    def __getstate__(self):
+        return self.entries, self.cum_weights, self.total
+
+    def __setstate__(self, state):
+        self.entries, self.cum_weights, self.total = state
+
+
+# -----------------------------------------------------------------------------
+def build_drop_table(case_id: int) -> DropTable:
+    """
+    Build the drop table for a case from its droppable CaseItems.
+    """
+    entries, weights = [], []
+    qs = (
+        CaseItem.objects
+        .filter(case_id=case_id, never_drop=False)
+        .select_related("item__rarity")
+        .order_by("id")
+    )
+    for ci in qs:
+        item = ci.item
+        rarity = item.rarity
+        entries.append({
+            "id":           item.id,
+            "label":        str(item),
+            "weapon_name":  item.weapon_name,
+            "skin_name":    item.skin_name or "",
+            "price":        item.price,
+            "image_url":    item.image.url if item.image else "",
+            "rarity_color": rarity.color if rarity else "#ffffff",
+        })
+        weights.append(ci.drop_chance)
+    return DropTable(entries, weights)
+
+# -----------------------------------------------------------------------------
+def get_drop_table(case_id: int) -> DropTable:
+    """
+    Return the compiled drop table for a case, building it only when stale.
+    """
+    version = get_case_version(case_id)
+    local = _local_tables.get(case_id)
+    if local and local[0] == version:
+        return local[1]
+
+    key = TABLE_KEY.format(case_id=case_id, version=version)
+    table = cache.get(key)
+    if table is None:
+        table = build_drop_table(case_id)
+        cache.set(key, table, TABLE_TTL)
+
+    _local_tables[case_id] = (version, table)
+    return table
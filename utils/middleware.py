@@ -2,7 +2,7 @@ from django.conf import settings
 from django.utils import timezone
 
 from main.models import Profile
-from utils.social_pipeline import _fetch_player
+from utils.steam_refresher import steam_refresher
 
 from django.http import Http404
 from django.urls import reverse
@@ -13,7 +13,7 @@ MAX_AGE_HOURS = getattr(settings, "STEAM_PROFILE_MAX_AGE", 12)
 # -----------------------------------------------------------------------------
 class RefreshSteamProfileMiddleware:
     """
-    Refresh Steam profile data when it becomes stale.
+    Queue a background refresh of Steam profile data when it becomes stale.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -26,7 +26,7 @@ class RefreshSteamProfileMiddleware:
     # -----------------------------------------------------------------------------
     def _maybe_refresh(self, user):
         """
-        Check profile age and update username/avatar if too old.
+        Check profile age and queue the SteamID for refresh if too old.
         """
         profile: Profile | None = getattr(user, "profile", None)
         if not profile or not profile.steamid:
@@ -38,29 +38,7 @@ class RefreshSteamProfileMiddleware:
             if age < MAX_AGE_HOURS:
                 return
 
-        # Fetch fresh data
-        player = _fetch_player(profile.steamid)
-        if not player:
-            return
-
-        changed = False
-        persona = player.get("personaname")
-        avatar  = player.get("avatarfull")
-
-        # Update username if needed
-        if persona and user.username != persona:
-            user.username = persona[:150]
-            user.save(update_fields=["username"])
-
-        # Update avatar if needed
-        if avatar and avatar != profile.steam_avatar:
-            profile.steam_avatar = avatar
-            changed = True
-
-        # Save changes and timestamp
-        if changed or not profile.last_steam_sync:
-            profile.last_steam_sync = timezone.now()
-            profile.save(update_fields=["steam_avatar", "last_steam_sync"])
+        steam_refresher.enqueue(profile.steamid)
 
 # -----------------------------------------------------------------------------
 class AdminRestrictIPMiddleware:
@@ -0,0 +1,90 @@
+"""
+On-disk HTTP page cache for the case importer.
+
+Pages are stored as <sha256(url)>.html under one directory and reused
+until they are older than the TTL, so pages shared by many cases (the
+knife and glove subpages) are downloaded once per run or refresh period.
+In offline mode only the stored files are used, which lets imports run
+against saved HTML fixtures without network access.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+IMPORT_CACHE_DIR = getattr(settings, "IMPORT_CACHE_DIR", "import_cache")
+IMPORT_CACHE_TTL = getattr(settings, "IMPORT_CACHE_TTL", 60 * 60 * 6)
+
+
+class PageNotCached(LookupError):
+    """Raised in offline mode when a page is not in the cache."""
+    pass
+
+# -----------------------------------------------------------------------------
+class PageCache:
+    """
+    URL-keyed file cache with a TTL, safe to share between threads.
+    """
+    def __init__(self, directory, fetch, ttl: float = IMPORT_CACHE_TTL, offline: bool = False):
+        self.directory = str(directory)
+        self.fetch_remote = fetch  # url -> bytes, raising on failure
+        self.ttl = ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, url: str) -> str:
+        """
+        Return the cache file path of a URL.
+        """
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".html")
+
+    def _lock(self, url: str) -> threading.Lock:
+        with self._guard:
+            return self._locks[url]
+
+    def _read(self, path: str) -> bytes | None:
+        try:
+            if not self.offline and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, url: str, content: bytes) -> None:
+        """
+        Atomically write a page to the cache.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content)
+        os.replace(tmp, self.path(url))
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Return the page body from the cache, downloading it when missing or
+        expired. Concurrent fetches of one URL download it only once.
+        """
+        path = self.path(url)
+        with self._lock(url):
+            content = self._read(path)
+            if content is not None:
+                with self._guard:
+                    self.hits += 1
+                return content
+            if self.offline:
+                raise PageNotCached(url)
+            content = self.fetch_remote(url)
+            with self._guard:
+                self.misses += 1
+            self.store(url, content)
+            return content
@@ -0,0 +1,109 @@
+"""
+Sorted in-memory price catalogue of all Items.
+
+Holds parallel arrays of prices and ids ordered by price, so range picks
+and nearest-price lookups are bisects instead of full-table scans. The
+catalogue is rebuilt lazily whenever its version token changes.
+"""
+
+import random
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from main.models import Item
+from utils.cache_versions import bump_versions, get_version
+
+CATALOGUE_VERSION_KEY = "price_catalogue_version"
+
+# (version, PriceCatalogue) of this process
+_local_catalogue: tuple[str, "PriceCatalogue"] | None = None
+
+# -----------------------------------------------------------------------------
+class PriceCatalogue:
+    """
+    Price-sorted arrays of Item prices and ids.
+    """
+    __slots__ = ("prices", "ids")
+
+    def __init__(self, rows) -> None:
+        self.prices: list[Decimal] = []
+        self.ids: list[int] = []
+        for price, item_id in rows:
+            self.prices.append(price)
+            self.ids.append(item_id)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def span(self, low: Decimal, high: Decimal) -> tuple[int, int]:
+        """
+        Return the [start, end) index range of items priced within [low, high].
+        """
+        return bisect_left(self.prices, low), bisect_right(self.prices, high)
+
+    def random_in_range(self, low: Decimal, high: Decimal, rng=random) -> int | None:
+        """
+        Return a random item id priced within [low, high], or None.
+        """
+        start, end = self.span(low, high)
+        if start >= end:
+            return None
+        return self.ids[rng.randrange(start, end)]
+
+    def nearest(self, price: Decimal) -> int | None:
+        """
+        Return the id of the item whose price is closest to price.
+        """
+        if not self.ids:
+            return None
+        idx = bisect_left(self.prices, price)
+        if idx == len(self.prices):
+            return self.ids[-1]
+        if idx and price - self.prices[idx - 1] <= self.prices[idx] - price:
+            return self.ids[idx - 1]
+        return self.ids[idx]
+
+
+# -----------------------------------------------------------------------------
+def get_price_catalogue() -> PriceCatalogue:
+    """
+    Return the price catalogue of this process, rebuilding it when stale.
+    """
+    global _local_catalogue
+    version = get_version(CATALOGUE_VERSION_KEY)
+    if _local_catalogue and _local_catalogue[0] == version:
+        return _local_catalogue[1]
+
+    rows = Item.objects.order_by("price", "id").values_list("price", "id")
+    catalogue = PriceCatalogue(rows.iterator(chunk_size=5000))
+    _local_catalogue = (version, catalogue)
+    return catalogue
+
+# -----------------------------------------------------------------------------
+def bump_price_catalogue() -> None:
+    """
+    Mark the price catalogue stale in every process.
+    """
+    bump_versions([CATALOGUE_VERSION_KEY])
+
+# -----------------------------------------------------------------------------
+def pick_item_in_range(low: Decimal, high: Decimal) -> Item | None:
+    """
+    Pick a random Item priced within [low, high], falling back to the
+    item priced closest to high when the range is empty.
+    """
+    catalogue = get_price_catalogue()
+    item_id = catalogue.random_in_range(low, high)
+    if item_id is None:
+        item_id = catalogue.nearest(high)
+    if item_id is None:
+        return None
+
+    item = Item.objects.select_related("rarity").filter(pk=item_id).first()
+    if item is None:
+        # stale catalogue entry: use the indexed price range directly
+        bump_price_catalogue()
+        qs = Item.objects.select_related("rarity").filter(price__range=(low, high))
+        count = qs.count()
+        item = qs.order_by("price", "id")[random.randrange(count)] if count else None
+    return item
@@ -0,0 +1,171 @@
+"""
+Rate limiters for outgoing API calls.
+
+Limiters use GCRA (a token bucket expressed as one "theoretical arrival
+time"), so the shared state is a single number that can live in process
+memory or in a small SQLite file shared by every worker process. Callers
+book a slot with reserve() and sleep outside any lock.
+
+Every lane is checked against the same arrival time, so all lanes together
+never exceed the budget. Priority decides who gets a slot: lower lanes
+stop bursting earlier, leaving headroom for higher ones, and only the high
+lane books slots in the future. Normal and low calls that would have to
+wait book nothing and try again later, so they never hold slots a purchase
+would otherwise get.
+"""
+
+from __future__ import annotations
+
+import abc
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH   = 0  # user-facing purchases (buy-for)
+PRIORITY_NORMAL = 1  # single lookups
+PRIORITY_LOW    = 2  # bulk background polling
+LANES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# -----------------------------------------------------------------------------
+class BaseRateLimiter(abc.ABC):
+    """
+    GCRA limiter: at most `rate` calls per `per` seconds, with `reserved`
+    burst slots per lane kept free for higher-priority lanes.
+    """
+    def __init__(self, rate: int, per: float, reserved: int = 1) -> None:
+        self.rate = rate
+        self.per = per
+        self.interval = per / rate
+        self.tolerance = {
+            lane: max(rate - 1 - lane * reserved, 0) * self.interval
+            for lane in LANES
+        }
+
+    # -----------------------------------------------------------------------------
+    def _schedule(self, tat: float, now: float, priority: int) -> tuple[float, float | None]:
+        """
+        Return (delay, new_tat) for a call arriving at now. new_tat is None
+        when a lower-priority call has to wait and so books nothing.
+        """
+        tat = max(tat, now)
+        delay = max(tat - self.tolerance[priority] - now, 0.0)
+        if delay > 0 and priority != PRIORITY_HIGH:
+            return delay, None
+        return delay, tat + self.interval
+
+    @abc.abstractmethod
+    def try_reserve(self, priority: int = PRIORITY_NORMAL) -> tuple[float, bool]:
+        """
+        Try to book a slot. Returns (delay, booked): when booked, wait delay
+        seconds before using the slot; otherwise retry after delay seconds.
+        """
+
+    def reserve(self, priority: int = PRIORITY_NORMAL) -> float:
+        """
+        Book a slot and return how many seconds to wait before using it.
+        Lower-priority calls sleep here until the budget has room for them.
+        """
+        while True:
+            delay, booked = self.try_reserve(priority)
+            if booked:
+                return delay
+            time.sleep(delay)
+
+    def wait(self, priority: int = PRIORITY_NORMAL) -> None:
+        """
+        Block until a request is allowed under the rate limit.
+        """
+        delay = self.reserve(priority)
+        if delay > 0:
+            time.sleep(delay)
+
+
+# -----------------------------------------------------------------------------
+class LocalRateLimiter(BaseRateLimiter):
+    """
+    In-process limiter; each process gets its own budget.
+    """
+    def __init__(self, rate: int, per: float, reserved: int = 1) -> None:
+        super().__init__(rate, per, reserved)
+        self.tat = 0.0
+        self.clock = time.monotonic
+        self.lock = threading.Lock()
+
+    def try_reserve(self, priority: int = PRIORITY_NORMAL) -> tuple[float, bool]:
+        with self.lock:
+            delay, tat = self._schedule(self.tat, self.clock(), priority)
+            if tat is not None:
+                self.tat = tat
+        return delay, tat is not None
+
+
+# -----------------------------------------------------------------------------
+class SQLiteRateLimiter(BaseRateLimiter):
+    """
+    Limiter whose state lives in a SQLite file, enforcing one budget across
+    all processes on the host. Falls back to an in-process limiter if the
+    file cannot be used.
+    """
+    def __init__(self, rate: int, per: float, path: str, name: str = "default",
+                 reserved: int = 1) -> None:
+        super().__init__(rate, per, reserved)
+        self.path = str(path)
+        self.name = name
+        self._local = threading.local()
+        self._fallback = LocalRateLimiter(rate, per, reserved)
+
+    # -----------------------------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit (name TEXT PRIMARY KEY, tat REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def try_reserve(self, priority: int = PRIORITY_NORMAL) -> tuple[float, bool]:
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tat FROM rate_limit WHERE name = ?", (self.name,)
+                ).fetchone()
+                delay, tat = self._schedule(row[0] if row else 0.0, time.time(), priority)
+                if tat is not None:
+                    conn.execute(
+                        "INSERT INTO rate_limit (name, tat) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET tat = excluded.tat",
+                        (self.name, tat),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return delay, tat is not None
+        except sqlite3.Error as exc:
+            logger.warning("shared rate limiter unavailable (%s), using local", exc)
+            return self._fallback.try_reserve(priority)
+
+
+# -----------------------------------------------------------------------------
+def build_rate_limiter(backend: str, rate: int, per: float, *, path: str | None = None,
+                       name: str = "default", reserved: int = 1) -> BaseRateLimiter:
+    """
+    Create a limiter for backend "local" or "sqlite".
+    """
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("sqlite rate limiter needs a path")
+        return SQLiteRateLimiter(rate, per, path, name=name, reserved=reserved)
+    if backend == "local":
+        return LocalRateLimiter(rate, per, reserved)
+    raise ValueError(f"Unknown rate limiter backend: {backend}")
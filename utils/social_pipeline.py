@@ -12,8 +12,9 @@ from main.models import Profile
 # Steam Web API endpoint and cache configuration
 API_URL = (
     "https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v0002/"
-    "?key={key}&steamids={steamid}"
+    "?key={key}&steamids={steamids}"
 )
+API_BATCH_SIZE = 100  # max steamids per GetPlayerSummaries call
 CACHE_TTL = 60 * 60 * 12  # 12 hours
 HEADERS = {
     # Desktop User-Agent to receive full profile layout
@@ -74,40 +75,60 @@ def fetch_steam_avatar_from_profile_page(steamid64: str) -> str | None:
     return None
 
 
-def _fetch_player(steamid64: str) -> dict | None:
+def _player_with_avatar(steamid64: str, player: dict) -> dict:
     """
-    Retrieve player data from cache or Steam API, then update avatar URL if needed.
+    Replace a static API avatar with the (possibly animated) profile-page one.
     """
-    cache_key = f"steam_profile_{steamid64}"
-    player = cache.get(cache_key)
-    if player:
-        return player
+    avatar_url = player.get("avatarfull", "")
+    if not avatar_url.lower().endswith(".gif"):
+        fallback = fetch_steam_avatar_from_profile_page(steamid64)
+        if fallback:
+            player["avatarfull"] = fallback
+    return player
 
-    # Fetch from official Steam API
-    try:
-        resp = requests.get(
-            API_URL.format(key=settings.SOCIAL_AUTH_STEAM_API_KEY, steamid=steamid64),
-            timeout=5
-        )
-        resp.raise_for_status()
-        data = resp.json().get("response", {}).get("players", [])
-        player = data[0] if data else {}
-    except Exception:
-        player = {}
 
-    # If API returned a GIF, cache and return
-    avatar_url = player.get("avatarfull", "")
-    if avatar_url.lower().endswith(".gif"):
-        cache.set(cache_key, player, CACHE_TTL)
-        return player
+def fetch_players(steamids) -> dict[str, dict]:
+    """
+    Retrieve player data for many SteamID64s from cache or the Steam API,
+    requesting up to API_BATCH_SIZE ids per GetPlayerSummaries call.
+    Players unknown to Steam map to an empty dict; ids of a batch whose
+    call failed are left out. Only players Steam returned are cached.
+    """
+    keys = {sid: f"steam_profile_{sid}" for sid in dict.fromkeys(steamids)}
+    cached = cache.get_many(keys.values())
+    players = {sid: cached[key] for sid, key in keys.items() if cached.get(key)}
+    missing = [sid for sid in keys if sid not in players]
+
+    fetched = {}
+    for i in range(0, len(missing), API_BATCH_SIZE):
+        chunk = missing[i:i + API_BATCH_SIZE]
+        try:
+            resp = requests.get(
+                API_URL.format(key=settings.SOCIAL_AUTH_STEAM_API_KEY, steamids=",".join(chunk)),
+                timeout=5
+            )
+            resp.raise_for_status()
+            data = resp.json().get("response", {}).get("players", [])
+        except Exception:
+            continue  # retried on the next call instead of cached as unknown
+        found = {p.get("steamid"): p for p in data}
+        for sid in chunk:
+            fetched[sid] = _player_with_avatar(sid, found.get(sid, {}))
+
+    if fetched:
+        cache.set_many(
+            {keys[sid]: player for sid, player in fetched.items() if player.get("steamid")},
+            CACHE_TTL,
+        )
+    players.update(fetched)
+    return players
 
-    # Otherwise, parse the public page for the correct avatar URL
-    fallback = fetch_steam_avatar_from_profile_page(steamid64)
-    if fallback:
-        player["avatarfull"] = fallback
 
-    cache.set(cache_key, player, CACHE_TTL)
-    return player
+def _fetch_player(steamid64: str) -> dict | None:
+    """
+    Retrieve player data from cache or Steam API, then update avatar URL if needed.
+    """
+    return fetch_players([steamid64]).get(steamid64)
 
 
 def update_profile_from_steam(strategy, backend, user=None, **kwargs):
@@ -0,0 +1,104 @@
+"""
+Transactional case-opening engine.
+
+A spin runs inside one transaction: the open counter is upserted, the
+balance is debited with a conditional UPDATE (``WHERE balance >= price``)
+that also refreshes the profile stats, and the won items and logs are
+bulk-inserted. Opening N cases at once costs the same number of statements.
+"""
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, LessThan
+
+from main.models import CaseOpenStat, InventoryItem, Item, Profile, TransactionLog
+from utils.drop_table import DropTable
+
+
+class InsufficientFunds(Exception):
+    """Raised when the balance cannot cover the spin price."""
+    pass
+
+# -----------------------------------------------------------------------------
+def _bump_open_stat(user, case, count: int) -> None:
+    """
+    Increment CaseOpenStat.opens for (user, case), creating the row if needed.
+    """
+    stats = CaseOpenStat.objects.filter(user=user, case=case)
+    if stats.update(opens=F("opens") + count):
+        return
+    try:
+        with transaction.atomic():
+            CaseOpenStat.objects.create(user=user, case=case, opens=count)
+    except IntegrityError:
+        # created concurrently by another spin
+        stats.update(opens=F("opens") + count)
+
+# -----------------------------------------------------------------------------
+def _debit_profile(profile: Profile, case, count: int, best: dict) -> None:
+    """
+    Debit count x case price and update stats in a single conditional UPDATE.
+    Raises InsufficientFunds when the balance is too low.
+    """
+    opens = CaseOpenStat.objects.filter(user_id=OuterRef("user_id")).values("opens")
+    fav_opens = Coalesce(Subquery(opens.filter(case_id=OuterRef("favorite_case_id"))[:1]), 0)
+    new_opens = Subquery(opens.filter(case_id=case.id)[:1])
+    best_price = Subquery(
+        Item.objects.filter(pk=OuterRef("best_drop_item_id")).values("price")[:1]
+    )
+
+    total = case.price * count
+    updated = Profile.objects.filter(pk=profile.pk, balance__gte=total).update(
+        balance=F("balance") - total,
+        cases_opened=F("cases_opened") + count,
+        favorite_case=models.Case(
+            models.When(favorite_case__isnull=True, then=Value(case.id)),
+            models.When(GreaterThan(new_opens, fav_opens), then=Value(case.id)),
+            default=F("favorite_case"),
+            output_field=models.BigIntegerField(),
+        ),
+        best_drop_item=models.Case(
+            models.When(best_drop_item__isnull=True, then=Value(best["id"])),
+            models.When(LessThan(best_price, Value(best["price"])), then=Value(best["id"])),
+            default=F("best_drop_item"),
+            output_field=models.BigIntegerField(),
+        ),
+    )
+    if not updated:
+        raise InsufficientFunds()
+
+# -----------------------------------------------------------------------------
+def open_case(user, profile: Profile, case, table: DropTable, count: int = 1) -> dict:
+    """
+    Charge the user for count spins, draw the items from the drop table
+    and record them. Returns a dict with the drops and the new balance.
+    """
+    if profile.balance < case.price * count:
+        raise InsufficientFunds()
+
+    won = table.sample(count)
+    with transaction.atomic():
+        _bump_open_stat(user, case, count)
+        _debit_profile(profile, case, count, max(won, key=lambda e: e["price"]))
+        inv_items = InventoryItem.objects.bulk_create([
+            InventoryItem(profile=profile, item_id=entry["id"]) for entry in won
+        ])
+        TransactionLog.objects.bulk_create([
+            TransactionLog(
+                user=user,
+                action_type="open_case",
+                details=(
+                    f"Opened case «{case.title}» (id={case.id}), "
+                    f"won «{entry['label']}» (id={entry['id']}), "
+                    f"charged {case.price:.2f}"
+                ),
+            )
+            for entry in won
+        ])
+        profile.balance = Profile.objects.values_list("balance", flat=True).get(pk=profile.pk)
+
+    return {
+        "drops":       [(entry, inv.id) for entry, inv in zip(won, inv_items)],
+        "new_balance": profile.balance,
+    }
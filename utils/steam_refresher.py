@@ -0,0 +1,114 @@
+"""
+Background refresh of stale Steam profiles.
+
+Requests only enqueue the SteamID of a stale profile; a daemon thread of
+the web process drains the queue every few seconds and refreshes all
+queued profiles with batched GetPlayerSummaries calls, so the Steam API
+and the profile-page avatar scrape never run inside a user's request.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from main.models import Profile
+from utils.social_pipeline import fetch_players
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = getattr(settings, "STEAM_REFRESH_INTERVAL", 5)  # seconds
+RETRY_AFTER = getattr(settings, "STEAM_REFRESH_RETRY_AFTER", 600)  # seconds
+
+# -----------------------------------------------------------------------------
+def refresh_profiles(steamids) -> int:
+    """
+    Refresh username, avatar and sync time of the profiles with the given
+    SteamIDs. Profiles whose player could not be fetched are left for a
+    later retry, and a persona name already taken by another user is not
+    applied. Returns the number of profiles refreshed.
+    """
+    players = fetch_players(steamids)
+    now = timezone.now()
+    profiles = list(
+        Profile.objects.select_related("user").filter(steamid__in=list(players))
+    )
+    User = get_user_model()
+    refreshed = []
+    for profile in profiles:
+        player = players.get(profile.steamid)
+        if not player:
+            continue
+        persona = (player.get("personaname") or "")[:150]
+        avatar = player.get("avatarfull")
+        if persona and profile.user.username != persona:
+            try:
+                with transaction.atomic():
+                    User.objects.filter(pk=profile.user_id).update(username=persona)
+            except IntegrityError:
+                logger.info("username %r is taken, keeping %r", persona, profile.user.username)
+        if avatar:
+            profile.steam_avatar = avatar
+        profile.last_steam_sync = now
+        refreshed.append(profile)
+
+    Profile.objects.bulk_update(refreshed, ["steam_avatar", "last_steam_sync"])
+    return len(refreshed)
+
+# -----------------------------------------------------------------------------
+class SteamRefresher:
+    """
+    Process-local queue of SteamIDs drained by a daemon thread.
+    """
+    def __init__(self, interval: float = REFRESH_INTERVAL, retry_after: float = RETRY_AFTER):
+        self.interval = interval
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._queued_at: dict[str, float] = {}
+        self._thread: threading.Thread | None = None
+
+    def enqueue(self, steamid: str) -> None:
+        """
+        Queue a SteamID for refresh unless it was queued recently.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._queued_at.get(steamid, -self.retry_after) < self.retry_after:
+                return
+            self._queued_at[steamid] = now
+            self._pending.add(steamid)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="steam-refresher", daemon=True
+                )
+                self._thread.start()
+
+    def drain(self) -> int:
+        """
+        Refresh all queued profiles now. Returns the number refreshed.
+        """
+        with self._lock:
+            steamids, self._pending = self._pending, set()
+            cutoff = time.monotonic() - self.retry_after
+            self._queued_at = {s: t for s, t in self._queued_at.items() if t > cutoff}
+        if not steamids:
+            return 0
+        return refresh_profiles(steamids)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("steam profile refresh failed")
+            finally:
+                close_old_connections()
+
+
+steam_refresher = SteamRefresher()
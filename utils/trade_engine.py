@@ -0,0 +1,166 @@
+"""
+Transactional upgrade and contract engine.
+
+Both flows run inside one transaction: the profile and the staked
+inventory rows are locked with SELECT ... FOR UPDATE, the stake is summed
+with one aggregate query, the balance is changed with a conditional
+UPDATE (``WHERE balance >= extra``) and the result item and log are
+bulk-inserted. A failure at any step leaves items and balance untouched.
+"""
+
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from main.models import InventoryItem, Item, Profile, TransactionLog
+from utils.price_catalogue import pick_item_in_range
+from utils.spin_engine import InsufficientFunds
+from utils.upgrade_targets import upgrade_chance
+
+CONTRACT_MIN_ITEMS = 3
+UPGRADE_CASHBACK = Decimal("0.02")
+
+
+class TradeError(Exception):
+    """Raised when an upgrade or contract request cannot be carried out."""
+    pass
+
+# -----------------------------------------------------------------------------
+def _lock_stake(profile: Profile, inv_ids) -> tuple[list[int], Decimal]:
+    """
+    Lock the profile and the staked inventory rows and return their ids
+    and total price. Raises TradeError if any item is missing or pending.
+    """
+    Profile.objects.select_for_update().filter(pk=profile.pk).first()
+    inv_ids = set(inv_ids)
+    locked = list(
+        InventoryItem.objects.select_for_update()
+        .filter(profile=profile, id__in=inv_ids, pending=False)
+        .values_list("id", flat=True)
+    )
+    if len(locked) != len(inv_ids):
+        raise TradeError("Some items are no longer available")
+    total = InventoryItem.objects.filter(id__in=locked).aggregate(
+        total=Sum("item__price")
+    )["total"] or Decimal("0")
+    return locked, total
+
+# -----------------------------------------------------------------------------
+def _settle(profile: Profile, extra: Decimal, credit: Decimal = Decimal("0"), **counters) -> None:
+    """
+    Debit extra, credit credit and bump counters in one conditional UPDATE.
+    Raises InsufficientFunds when the balance cannot cover extra.
+    """
+    updated = Profile.objects.filter(pk=profile.pk, balance__gte=extra).update(
+        balance=F("balance") - extra + credit,
+        **{name: F(name) + step for name, step in counters.items()},
+    )
+    if not updated:
+        raise InsufficientFunds()
+
+# -----------------------------------------------------------------------------
+def run_upgrade(user, profile: Profile, inv_ids, target: Item, extra: Decimal) -> dict:
+    """
+    Stake inventory items plus extra balance on upgrading into target.
+    Returns a dict with is_win, chance, the new inventory item (or None)
+    and the new balance.
+    """
+    if extra < 0:
+        raise TradeError("Invalid extra balance")
+    if target.price <= 0:
+        raise TradeError("Invalid target item")
+    if profile.balance < extra:
+        raise InsufficientFunds()
+
+    with transaction.atomic():
+        used, total = _lock_stake(profile, inv_ids)
+        attempt = total + extra
+        chance = upgrade_chance(attempt, target.price)
+        is_win = random.uniform(0, 100) <= float(chance)
+
+        if is_win:
+            _settle(profile, extra, upgrades_count=1)
+        else:
+            _settle(profile, extra, attempt * UPGRADE_CASHBACK)
+        InventoryItem.objects.filter(id__in=used).delete()
+
+        new_items = InventoryItem.objects.bulk_create(
+            [InventoryItem(profile=profile, item=target)] if is_win else []
+        )
+        TransactionLog.objects.bulk_create([TransactionLog(
+            user=user,
+            action_type="upgrade",
+            details=(
+                f"{'Success' if is_win else 'Fail'} upgrade to «{target}» "
+                f"(id={target.id}), bet {attempt:.2f}, chance {chance:.2f}%"
+            ),
+        )])
+        profile.balance = Profile.objects.values_list("balance", flat=True).get(pk=profile.pk)
+
+    return {
+        "is_win":      is_win,
+        "chance":      chance,
+        "new_item":    new_items[0] if new_items else None,
+        "new_balance": profile.balance,
+    }
+
+# -----------------------------------------------------------------------------
+def _contract_multiplier(roll: float) -> float:
+    """
+    Map a 0-100 roll to the contract value multiplier.
+    """
+    if roll <= 50:
+        return 0.5
+    if roll <= 94:
+        return 2
+    if roll <= 98:
+        return 3
+    if roll <= 98.9:
+        return 4
+    return 5
+
+# -----------------------------------------------------------------------------
+def run_contract(user, profile: Profile, inv_ids, extra: Decimal) -> dict:
+    """
+    Trade at least CONTRACT_MIN_ITEMS inventory items plus extra balance
+    for one random item. Returns a dict with the multiplier, the result
+    value, the new inventory item and the new balance.
+    """
+    if len(set(inv_ids)) < CONTRACT_MIN_ITEMS:
+        raise TradeError(f"At least {CONTRACT_MIN_ITEMS} items required")
+    if extra < 0:
+        raise TradeError("Invalid extra balance")
+    if profile.balance < extra:
+        raise InsufficientFunds()
+
+    with transaction.atomic():
+        used, total = _lock_stake(profile, inv_ids)
+        attempt = total + extra
+        mult = _contract_multiplier(random.uniform(0, 100))
+        result_value = attempt * Decimal(str(mult))
+        chosen = pick_item_in_range(attempt * Decimal("0.5"), result_value)
+        if chosen is None:
+            raise TradeError("No items available")
+
+        _settle(profile, extra, contracts_count=1)
+        InventoryItem.objects.filter(id__in=used).delete()
+
+        new_item, = InventoryItem.objects.bulk_create([InventoryItem(profile=profile, item=chosen)])
+        TransactionLog.objects.bulk_create([TransactionLog(
+            user=user,
+            action_type="contract",
+            details=(
+                f"Contract of {len(used)} items (sum {total:.2f} + extra {extra:.2f}), "
+                f"mult {mult}, result «{chosen}» (id={chosen.id})"
+            ),
+        )])
+        profile.balance = Profile.objects.values_list("balance", flat=True).get(pk=profile.pk)
+
+    return {
+        "multiplier":   mult,
+        "result_value": result_value,
+        "new_item":     new_item,
+        "new_balance":  profile.balance,
+    }
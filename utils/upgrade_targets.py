@@ -0,0 +1,50 @@
+"""
+Upgrade target recommendations bucketed by win chance.
+
+An upgrade wins with chance min(stake / target price * 100, MAX_CHANCE),
+so every chance level maps to a contiguous price band. The bands are cut
+out of the price-sorted in-memory price catalogue with bisects.
+"""
+
+from bisect import bisect_right
+from decimal import Decimal
+
+from utils.price_catalogue import get_price_catalogue
+
+MAX_CHANCE = 75
+CHANCE_LEVELS = (75, 50, 25, 10)  # descending; each bucket ends at the next level
+
+# -----------------------------------------------------------------------------
+def upgrade_chance(stake: Decimal, price: Decimal) -> Decimal:
+    """
+    Return the win chance in percent of upgrading stake into an item of price.
+    """
+    return min((stake / price) * 100, MAX_CHANCE)
+
+# -----------------------------------------------------------------------------
+def recommend_targets(stake: Decimal, per_bucket: int = 12) -> list[dict]:
+    """
+    Split upgrade targets for a stake into win-chance buckets.
+
+    Bucket N holds items priced above the stake whose chance is at least N
+    percent but below the previous level; up to per_bucket of the most
+    expensive ones are returned as ids, with the band and its total size.
+    """
+    catalogue = get_price_catalogue()
+    buckets = []
+    low = stake  # cheaper items are not an upgrade
+    for level in CHANCE_LEVELS:
+        high = stake * 100 / level
+        if high <= low:
+            continue
+        start = bisect_right(catalogue.prices, low)
+        end = bisect_right(catalogue.prices, high)
+        buckets.append({
+            "chance":    level,
+            "min_price": low,
+            "max_price": high,
+            "total":     max(end - start, 0),
+            "ids":       catalogue.ids[max(start, end - per_bucket):end][::-1],
+        })
+        low = high
+    return buckets
@@ -3,6 +3,8 @@ import math
 from decimal import Decimal
 
 BASE_64 = 76561197960265728  # Steam ID offset for conversion
+DROP_CHANCE_STEEPNESS = 0.94  # decay of drop chance per case price above the case price
+DROP_CHANCE_FLOOR = 1e-16
 
 # -----------------------------------------------------------------------------
 def steamid32_to_64(id32: int) -> str:
@@ -38,8 +40,7 @@ def compute_drop_chance(case_price: Decimal, item_price: Decimal) -> float:
     Uses an exponential decay model.
     """
     ratio = float(item_price / case_price)
-    steepness = 0.94
     if ratio <= 1:
         return 1.0
-    chance = math.exp(-steepness * (ratio - 1))
-    return max(chance, 1e-16)
+    chance = math.exp(-DROP_CHANCE_STEEPNESS * (ratio - 1))
+    return max(chance, DROP_CHANCE_FLOOR)
@@ -0,0 +1,159 @@
+"""
+Durable, DB-backed queue of withdrawal submissions.
+
+The web request only claims the items and enqueues a WithdrawalJob per
+Withdrawal; worker processes (manage.py run_withdrawal_worker) claim jobs
+with a conditional UPDATE, run process_withdrawal and reschedule failed
+attempts with exponential backoff.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from main.models import Withdrawal, WithdrawalJob
+from main.tasks import WithdrawalRetry, fail_withdrawal, process_withdrawal
+from utils.withdrawals import claim_items
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, "WITHDRAWAL_JOB_MAX_ATTEMPTS", 5)
+BACKOFF_BASE = getattr(settings, "WITHDRAWAL_JOB_BACKOFF", 30)   # seconds
+LOCK_TIMEOUT = getattr(settings, "WITHDRAWAL_JOB_LOCK_TIMEOUT", 300)
+
+# -----------------------------------------------------------------------------
+def enqueue_withdrawals(user, profile, item_ids: list[str]) -> tuple[list[int], list[str]]:
+    """
+    Claim the requested inventory items and queue one job per item in one
+    transaction, so a failed insert never leaves items stuck pending.
+    Returns (queued_inventory_ids, error_messages).
+    """
+    stamp = int(time.time())
+    with transaction.atomic():
+        claimed, errors = claim_items(user, profile, item_ids)
+        withdrawals = Withdrawal.objects.bulk_create([
+            Withdrawal(
+                user=user,
+                inventory_item=inv,
+                # random suffix: a retry within the same second needs a new id
+                custom_id=f"{user.id}_{inv.id}_{stamp}_{uuid.uuid4().hex[:8]}",
+                status="pending",
+            )
+            for inv in claimed
+        ])
+        WithdrawalJob.objects.bulk_create([
+            WithdrawalJob(withdrawal=wd) for wd in withdrawals
+        ])
+    return [inv.id for inv in claimed], errors
+
+# -----------------------------------------------------------------------------
+def _claimable(now) -> Q:
+    """
+    Jobs that are due, or running jobs whose worker stopped reporting.
+    """
+    return (
+        Q(status="queued", run_after__lte=now)
+        | Q(status="running", locked_at__lt=now - timedelta(seconds=LOCK_TIMEOUT))
+    )
+
+# -----------------------------------------------------------------------------
+def claim_job(worker_id: str, tries: int = 5) -> WithdrawalJob | None:
+    """
+    Atomically take the next due job for this worker. The due row is read
+    with SELECT ... FOR UPDATE SKIP LOCKED where supported, so concurrent
+    workers pick different jobs; the conditional UPDATE by pk decides the
+    winner on backends without row locks.
+    """
+    for _ in range(tries):
+        now = timezone.now()
+        with transaction.atomic():
+            job_id = (
+                WithdrawalJob.objects.select_for_update(skip_locked=True)
+                .filter(_claimable(now))
+                .order_by("run_after", "id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+            taken = WithdrawalJob.objects.filter(_claimable(now), pk=job_id).update(
+                status="running",
+                locked_at=now,
+                locked_by=worker_id,
+                attempts=F("attempts") + 1,
+            )
+        if taken:
+            return WithdrawalJob.objects.select_related("withdrawal").get(pk=job_id)
+    return None
+
+# -----------------------------------------------------------------------------
+def run_job(job: WithdrawalJob) -> None:
+    """
+    Process one claimed job and record its outcome. A job whose withdrawal
+    was deleted meanwhile (the job row goes with it) is skipped.
+    """
+    try:
+        ok = process_withdrawal(job.withdrawal_id)
+    except Withdrawal.DoesNotExist:
+        logger.info("withdrawal job %s: withdrawal %s is gone", job.id, job.withdrawal_id)
+        return
+    except Exception as exc:
+        job.last_error = str(exc)[:1000]
+        if not isinstance(exc, WithdrawalRetry):
+            logger.exception("withdrawal job %s crashed", job.id)
+        if job.attempts >= MAX_ATTEMPTS:
+            fail_withdrawal(job.withdrawal)
+            job.status = "failed"
+        else:
+            job.status = "queued"
+            job.run_after = timezone.now() + timedelta(
+                seconds=BACKOFF_BASE * 2 ** (job.attempts - 1)
+            )
+    else:
+        job.status = "done" if ok else "failed"
+    job.locked_at = None
+    job.locked_by = ""
+    # UPDATE instead of save(): a no-op if the job was deleted meanwhile
+    WithdrawalJob.objects.filter(pk=job.pk).update(
+        status=job.status,
+        run_after=job.run_after,
+        locked_at=None,
+        locked_by="",
+        last_error=job.last_error,
+    )
+
+# -----------------------------------------------------------------------------
+def work(*, worker_id: str | None = None, once: bool = False, idle_sleep: float = 2.0,
+         stop: threading.Event | None = None) -> int:
+    """
+    Claim and run jobs until stopped (or until the queue is empty if once).
+    Returns the number of jobs processed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_job(worker_id)
+        if job is None:
+            if once:
+                break
+            stop.wait(idle_sleep)
+            continue
+        try:
+            run_job(job)
+        except Exception:
+            # keep the worker alive; the job is retried once its lock times out
+            logger.exception("withdrawal job %s could not be recorded", job.id)
+        done += 1
+    close_old_connections()
+    return done
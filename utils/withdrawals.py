@@ -0,0 +1,117 @@
+"""
+Withdrawal helpers: claiming inventory items for withdrawal and the local
+copy of market withdrawal state.
+
+Views read the stored state and refresh only stale rows, all with one
+batched get-list-buy-info-by-custom-id call, so a page with many pending
+withdrawals costs at most one round trip to the market.
+"""
+
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import InventoryItem, Withdrawal
+from utils.csgo_market_api import get_list_buy_info_by_custom_ids
+
+logger = logging.getLogger(__name__)
+
+# Views refresh withdrawals whose state is older than this many seconds
+STATUS_MAX_AGE = getattr(settings, "WITHDRAWAL_STATUS_MAX_AGE", 120)
+
+STATE_FIELDS = ["stage", "market_status", "checked_at"]
+
+# -----------------------------------------------------------------------------
+def apply_buy_info(wd: Withdrawal, info: dict, now) -> bool:
+    """
+    Store stage/status from a market buy-info dict on the withdrawal.
+    Returns True when the stage or status changed.
+    """
+    stage = info.get("stage")
+    stage = int(stage) if stage not in (None, "") else None
+    status = str(info.get("status") or "")
+    changed = stage != wd.stage or status != wd.market_status
+    wd.stage = stage
+    wd.market_status = status
+    wd.checked_at = now
+    return changed
+
+# -----------------------------------------------------------------------------
+def refresh_stale(withdrawals: list[Withdrawal], max_age: int = STATUS_MAX_AGE) -> None:
+    """
+    Re-check withdrawals whose local state is missing or older than max_age
+    seconds with one batched API call, and persist the new state.
+    If the market API is unreachable the stored state is kept as is.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=max_age)
+    stale = [
+        wd for wd in withdrawals
+        if wd.offer_id and (wd.checked_at is None or wd.checked_at < cutoff)
+    ]
+    if not stale:
+        return
+
+    try:
+        ok, all_info = get_list_buy_info_by_custom_ids([wd.custom_id for wd in stale])
+    except (requests.RequestException, ValueError):
+        logger.warning("withdrawal status refresh failed", exc_info=True)
+        return
+    if not ok:
+        return
+    for wd in stale:
+        apply_buy_info(wd, all_info.get(wd.custom_id, {}) or {}, now)
+    Withdrawal.objects.bulk_update(stale, STATE_FIELDS)
+
+# -----------------------------------------------------------------------------
+def market_hash_name(inv_item: InventoryItem) -> str:
+    """
+    Return the market name to buy for an inventory item.
+    """
+    item = inv_item.item
+    return item.market_hash_name or (
+        f"{item.weapon_name} | {item.skin_name}" if item.skin_name else item.weapon_name
+    )
+
+# -----------------------------------------------------------------------------
+def claim_items(user, profile, item_ids: list[str]) -> tuple[list[InventoryItem], list[str]]:
+    """
+    Lock the requested inventory items and mark the free ones pending.
+    Returns (claimed_items, error_messages).
+    """
+    errors = []
+    wanted = []
+    for item_id in item_ids:
+        if str(item_id).isdigit():
+            wanted.append(int(item_id))
+        else:
+            errors.append(f"{item_id}: not found")
+
+    with transaction.atomic():
+        items = {
+            inv.id: inv
+            for inv in InventoryItem.objects.select_for_update()
+            .select_related("item")
+            .filter(profile=profile, id__in=wanted)
+        }
+        busy = set(
+            Withdrawal.objects.filter(user=user, inventory_item_id__in=items, status="pending")
+            .values_list("inventory_item_id", flat=True)
+        )
+        claimed = {}
+        for item_id in wanted:
+            inv = items.get(item_id)
+            if inv is None:
+                errors.append(f"{item_id}: not found")
+            elif inv.pending or item_id in busy or item_id in claimed:
+                # a repeated id counts as pending on its second occurrence
+                errors.append(f"{item_id}: already pending")
+            else:
+                claimed[item_id] = inv
+        claimed = list(claimed.values())
+        InventoryItem.objects.filter(id__in=[inv.id for inv in claimed]).update(pending=True)
+    return claimed, errors